@@ -0,0 +1,83 @@
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+import cv2
+import rasterio
+from rasterio.transform import from_origin
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.floodfill import skeleton_trace
+
+
+"""
+Benchmark of skeleton_trace on synthetic contour rasters.
+Draws nested, wavy contour rings on square images of increasing size and prints the trace time per size.
+"""
+
+
+# Parameters:
+# ---------------------------------------------
+image_sizes = [500, 1000, 2000, 4000]
+contour_spacing = 25  # distance between contour rings in pixels
+pixel_size = 1.25     # pixel size of the synthetic map in meters
+seed = 0
+
+# ---------------------------------------------
+
+
+def synthetic_contours(size, spacing=25, seed=0):
+    """
+    Draws nested, wavy closed contour lines (1 pixel wide) like the skeleton of a hill.
+
+    Parameters:
+    size (int): Width and height of the raster in pixels.
+    spacing (int): Distance between neighbouring contour lines in pixels.
+    seed (int): Seed of the random wave pattern.
+
+    Returns:
+    ndarray: Binary contour image (0/255 uint8).
+    """
+    rng = np.random.default_rng(seed)
+    image = np.zeros((size, size), np.uint8)
+    center = np.array([size / 2, size / 2])
+    angles = np.linspace(0, 2 * np.pi, 720, endpoint=False)
+    phase = rng.uniform(0, 2 * np.pi, 3)
+
+    for radius in range(spacing, int(size * 0.7), spacing):
+        wave = 1 + 0.08 * np.sin(3 * angles + phase[0]) + 0.05 * np.sin(7 * angles + phase[1])
+        points = center + radius * wave[:, None] * np.stack([np.cos(angles), np.sin(angles)], axis=1)
+        cv2.polylines(image, [points.astype(np.int32)], True, 255, 1)
+
+    return image
+
+
+def write_test_data(directory, size):
+    skeleton_img_path = os.path.join(directory, f"skeleton_{size}.png")
+    original_img_path = os.path.join(directory, f"map_{size}.tif")
+
+    cv2.imwrite(skeleton_img_path, synthetic_contours(size, contour_spacing, seed))
+
+    with rasterio.open(
+        original_img_path, 'w', driver='GTiff', height=size, width=size, count=1, dtype='uint8',
+        crs='EPSG:21781', transform=from_origin(600000, 200000, pixel_size, pixel_size)
+    ) as dst:
+        dst.write(np.zeros((size, size), np.uint8), 1)
+
+    return skeleton_img_path, original_img_path
+
+
+with tempfile.TemporaryDirectory() as tmp_dir:
+    results = []
+    for size in image_sizes:
+        skeleton_img_path, original_img_path = write_test_data(tmp_dir, size)
+        output_path_geojson = os.path.join(tmp_dir, f"skeleton_{size}.geojson")
+
+        start_time = time.time()
+        skeleton_trace(skeleton_img_path, original_img_path, output_path_geojson, overwrite=True)
+        results.append((size, time.time() - start_time))
+
+    print(f"{'size':>12} {'time [s]':>10} {'s / Mpx':>10}")
+    for size, elapsed in results:
+        print(f"{f'{size}x{size}':>12} {elapsed:>10.2f} {elapsed / (size * size / 1e6):>10.2f}")
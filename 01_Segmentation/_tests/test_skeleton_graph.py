@@ -0,0 +1,62 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from utils.skeleton_graph import trace_skeleton_graph, prune_skeleton, remove_staircases
+
+
+"""
+Tests of the skeleton graph tracing and pruning on small hand-drawn skeletons.
+Run from 01_Segmentation with: python -m pytest _tests
+"""
+
+
+def crossing(shape):
+    # two 1 px lines of 9 px arms crossing at (10, 10), either straight ("+") or diagonal ("X")
+    skeleton = np.zeros((21, 21), np.uint8)
+    arm = np.arange(1, 10)
+    if shape == '+':
+        skeleton[10, 1:20] = 1
+        skeleton[1:20, 10] = 1
+    else:
+        for di, dj in ((-1, -1), (-1, 1), (1, -1), (1, 1)):
+            skeleton[10 + di * arm, 10 + dj * arm] = 1
+        skeleton[10, 10] = 1
+    return skeleton
+
+
+@pytest.mark.parametrize('shape', ['+', 'X'])
+def test_crossing_arms_end_on_one_node(shape):
+    skeleton = crossing(shape)
+    polylines = trace_skeleton_graph(skeleton)
+
+    assert len(polylines) == 4
+    # every arm runs from the crossing pixel to its free end
+    assert all([10, 10] in (p[0], p[-1]) for p in polylines)
+    # together the arms cover the skeleton
+    traced = np.zeros_like(skeleton)
+    for p in polylines:
+        p = np.array(p)
+        traced[p[:, 1], p[:, 0]] = 1
+    np.testing.assert_array_equal(traced, skeleton)
+
+
+@pytest.mark.parametrize('length', [1, 2, 7, 8, 15, 16])
+def test_prune_keeps_lines_without_junction(length):
+    skeleton = np.zeros((5, 30), np.uint8)
+    skeleton[2, 3:3 + length] = 1
+    np.testing.assert_array_equal(prune_skeleton(skeleton, spur_length=10), skeleton > 0)
+
+
+def test_prune_removes_spur_of_junction():
+    # a line with a short spur near its end and a long branch hanging off it
+    skeleton = np.zeros((30, 40), np.uint8)
+    skeleton[20, 2:38] = 1
+    skeleton[16:20, 10] = 1
+    skeleton[8:20, 25] = 1
+    expected = remove_staircases(skeleton)  # the junctions move up by one pixel, (19, 10) and (19, 25)
+    expected[16:19, 10] = False
+    np.testing.assert_array_equal(prune_skeleton(skeleton, spur_length=6), expected)
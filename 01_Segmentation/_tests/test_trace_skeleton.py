@@ -0,0 +1,67 @@
+import os
+import sys
+
+import numpy as np
+import cv2
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import reference_trace_skeleton as reference
+from utils import trace_skeleton
+
+
+"""
+Regression tests of utils/trace_skeleton.py against the reference copy of the original implementation.
+Run from 01_Segmentation with: python -m pytest _tests
+"""
+
+
+def random_strokes(size, seed, n=12, thickness=3):
+    # random polylines a few pixels wide, crossing and touching each other (0/1 uint8)
+    rng = np.random.default_rng(seed)
+    image = np.zeros((size, size), np.uint8)
+    for _ in range(n):
+        points = rng.integers(0, size, (rng.integers(2, 5), 2)).astype(np.int32)
+        cv2.polylines(image, [points], False, 1, thickness)
+    return image
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_thinning_zs_equals_reference(seed):
+    image = random_strokes(48, seed)
+    expected = reference.thinningZS(image.astype(np.int64))
+    np.testing.assert_array_equal(trace_skeleton.thinningZS(image), expected)
+
+
+def polylines(frags):
+    return [[tuple(p) for p in f] for f in frags]
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_trace_skeleton_tiled_equals_reference(seed):
+    skeleton = reference.thinningSkimage(random_strokes(300, seed, n=40))
+    expected = reference.traceSkeleton(skeleton.astype(np.int64), 0, 0, 300, 300, 10, 999, None)
+    frags = trace_skeleton.traceSkeletonTiled(skeleton, 0, 0, 300, 300, 10, 999, None, tileSize=64, processes=2)
+    assert polylines(frags) == polylines(expected)
+
+
+def seam_fragments(rng, n, sx, near, isv):
+    # fragments whose ends lie on, next to or away from the seam, many of them within merge distance of each other
+    frags = []
+    for _ in range(n):
+        ends = [[int(rng.choice([sx, near, sx + 10])), int(rng.integers(0, 30))] for _ in range(2)]
+        frags.append([e[::-1] if isv else e for e in (ends[0], [sx + 20, 15], ends[1])])
+    return frags
+
+
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('dr', [trace_skeleton.HORIZONTAL, trace_skeleton.VERTICAL])
+def test_merge_frags_equals_reference(seed, dr):
+    rng = np.random.default_rng(seed)
+    isv = dr != trace_skeleton.HORIZONTAL
+    c0, c1 = seam_fragments(rng, 30, 50, 49, isv), seam_fragments(rng, 30, 50, 51, isv)
+    expected = [[list(p) for p in f] for f in c0]
+    reference.mergeFrags(expected, [[list(p) for p in f] for f in c1], 50, dr)
+    trace_skeleton.mergeFrags(c0, c1, 50, dr)
+    assert polylines(c0) == polylines(expected)
@@ -1,24 +1,41 @@
 from utils.select_seed import *
 from utils.segmentation import *
 from utils.floodfill import *
+from utils.color_classification import classify_image, contour_threshold_lut, load_or_build_lut, CONTOUR
+from utils.skeleton_graph import prune_skeleton
 import cv2
-import tkinter as tk
-from tkinter import messagebox
+from multiprocessing import Pool
 from utils.general_functions import *
 
 
 """
 This script is the main script for the segmentation of the maps.
-Start the script, select the seed point and the script will segment the map and save the skeleton as a geojson file.
+Start the script and it will segment the map of every year and save the skeleton as a geojson file.
+No seed point is needed, both segmentation modes classify the contour pixels by color over the whole map, so no
+window is opened and several years are processed in parallel.
 """
 
 
 # Parameters:
 # ---------------------------------------------
+segmentation_mode = 'hsv'         # 'hsv' (mask_image + flood_fill) or 'lut' (RGB lookup table, cached per year)
+roi_factor = None                 # 'hsv' mode: search contour regions at 1/roi_factor resolution first, None for full resolution
+prune_spur_length = 0             # remove skeleton spurs up to this length in pixels, 0 to keep them
+prune_min_component_length = 0    # remove skeleton parts with fewer pixels, 0 to keep them
+skeleton_trace_engine = 'recursive'  # 'recursive', 'queue' (no recursion depth limit) or 'graph' (linear time)
 skeleton_trace_iterations = 500
+skeleton_simplify_tolerance = None # simplify the traced lines with this tolerance in meters, None to keep all vertices
+skeleton_join_gap = None          # join traced lines with ends closer than this in meters, None to keep them apart
+skeleton_join_max_angle = 45      # maximum bend in degrees at a join (only used with skeleton_join_gap)
+skeleton_trace_tile_size = 2048   # trace the skeleton in tiles of this size on all cores, None for a serial trace
+skeleton_trace_processes = None   # number of worker processes for the tiled trace, None for all cores
+skeletonize_tile_size = None      # skeletonize in tiles of this size on all cores, None for a single pass
+skeletonize_processes = None      # number of worker processes for the tiled skeletonization, None for all cores
+save_skeleton_png = False        # additionally save the skeleton as PNG (for debugging)
 years = [1904,1912,1930,1939]
 years = [2024]
 overwrite = False
+processes = None                 # number of years processed in parallel, None for one process per year (max. all cores)
 
 
 # Input paths:
@@ -36,61 +53,85 @@ base_path = "/Volumes/T7 Shield/GMP2/Report_Documentation/"
 # ---------------------------------------------
 
 
-images = []
-seed_points = []
-current_years = []
-skeleton_img_paths = []
-image_file_paths = []
-output_paths_geojson = []
- 
+def segment_year(year, trace_processes=skeleton_trace_processes, skeletonize_processes=skeletonize_processes):
+    """
+    Segments the map of one year and saves the traced skeleton as GeoJSON.
 
+    Parameters:
+    year (int): Year of the map.
+    trace_processes (int, optional): Number of worker processes for the tiled skeleton trace.
+    skeletonize_processes (int, optional): Number of worker processes for the tiled skeletonization.
 
-for year in years:
-    
-    image_file = f"stiched_map_{year}_clipped.tif"
-    output_dir = base_path_output + str(year) + "/"
-    
-    ensure_file_exists(base_path + image_file)
-    ensure_directory_exists(output_dir)
+    Returns:
+    str: Path of the GeoJSON file.
+    """
+    print(f"Processing image from {year}...")
 
+    image_file_path = base_path + f"stiched_map_{year}_clipped.tif"
+    output_dir = base_path_output + str(year) + "/"
     skeleton_img_path = output_dir + f"skeleton_{year}.png"
     output_path_geojson = output_dir + f"skeleton_{year}.geojson"
 
-    image_file_path = base_path + image_file
-
     image = cv2.imread(image_file_path, cv2.IMREAD_COLOR)
     image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    del image
 
-    seed_point = select_seed(image)
+    if segmentation_mode == 'hsv' and roi_factor:
+        skeleton_result = segment_roi(image_rgb, factor=roi_factor, halo=32, blob_threshold_size=12, dilate_kernel_size=5)
+        if save_skeleton_png:
+            plt.imsave(skeleton_img_path, skeleton_result, cmap='gray')
+    else:
+        if segmentation_mode == 'lut':
+            lut = load_or_build_lut(output_dir + f"color_lut_{year}.npy", contour_threshold_lut)
+            flood_result = classify_image(image_rgb, lut) == CONTOUR
+        else:
+            image_to_process = mask_image(image_rgb)
 
-    assert check_seed_point(seed_point,image), "No seed point was selected."
-    
-    images.append(image_rgb)
-    seed_points.append(seed_point)
-    current_years.append(year)
-    skeleton_img_paths.append(skeleton_img_path)
-    image_file_paths.append(image_file_path)
-    output_paths_geojson.append(output_path_geojson)
+            flood_result = flood_fill(image_to_process)
 
-    
-    assert len(images) == len(seed_points), "The number of images and seed points does not match."
+        connected_result = find_connected_components(flood_result, blob_threshold_size=12, dilate_kernel_size=5)
 
+        skeleton_result = skeletonize_image(connected_result,save_path=skeleton_img_path if save_skeleton_png else None,
+                                            tile_size=skeletonize_tile_size,processes=skeletonize_processes)
+
+    if prune_spur_length or prune_min_component_length:
+        skeleton_result = prune_skeleton(skeleton_result, prune_spur_length, prune_min_component_length)
+
+    skeleton_trace(skeleton_result,image_file_path,output_path_geojson,skeleton_trace_iterations,overwrite=overwrite,
+                   tile_size=skeleton_trace_tile_size,processes=trace_processes,engine=skeleton_trace_engine,
+                   simplify_tolerance=skeleton_simplify_tolerance,join_gap=skeleton_join_gap,join_max_angle=skeleton_join_max_angle)
+
+    return output_path_geojson
 
-for image_rgb,seed_point,current_year,skeleton_img_path,image_file_path,output_path_geojson in zip(images,seed_points,current_years,skeleton_img_paths,image_file_paths,output_paths_geojson):
-    
-    print(f"Processing image from {current_year}...")
 
-    image_to_process = mask_image(image_rgb)
+def segment_year_task(year):
+    # pool workers are daemonic and cannot start the worker pools of the tiled steps, so they run serially here
+    return segment_year(year, trace_processes=1, skeletonize_processes=1)
 
-    flood_result = flood_fill(image_to_process, seed_point, tolerance=0.5)
 
-    connected_result = find_connected_components(flood_result, blob_threshold_size=12, dilate_kernel_size=5)
+# worker processes (tiled skeletonization and trace, parallel years) import this script
+if __name__ == "__main__":
 
-    skeleton_result = skeletonize_image(connected_result,save_path=skeleton_img_path) 
+    tasks = []
 
-    skeleton_traces = skeleton_trace(skeleton_img_path,image_file_path,output_path_geojson,skeleton_trace_iterations,overwrite=overwrite)
+    for year in years:
     
+        image_file = f"stiched_map_{year}_clipped.tif"
+        output_dir = base_path_output + str(year) + "/"
     
-print("--> Done")
+        ensure_file_exists(base_path + image_file)
+        ensure_directory_exists(output_dir)
 
+        tasks.append(year)
 
+
+    if len(tasks) > 1 and processes != 1:
+        with Pool(min(processes or os.cpu_count(), len(tasks))) as pool:
+            for output_path_geojson in pool.imap_unordered(segment_year_task, tasks):
+                print(f"Finished {output_path_geojson}")
+    else:
+        for year in tasks:
+            segment_year(year)
+    
+    
+    print("--> Done")
@@ -1,9 +1,12 @@
-from utils.segmentation import assign_heights
+from utils.segmentation import build_height_index, assign_heights_indexed, build_height_raster, assign_heights_raster
 import os
 
 
 """
 Use exisitng contour line heights to assign heights to the skeleton.
+The index of the source contour lines is built once (and cached next to the source), all years are queried against it.
+Method 'index': nearest source vertex per line (KD-tree). Method 'raster': majority height of the vertices of a line on a
+nearest-contour raster (distance transform of the rasterized source lines).
 """
 
 # Parameters:
@@ -12,10 +15,18 @@ Use exisitng contour line heights to assign heights to the skeleton.
 base_path = "/Volumes/T7 Shield/GMP_Data/processed_data/00_Segmentation/"
 overwrite = False
 years = [1899]
+max_distance = 50       # maximum distance between a line and the contour line it gets the height from (meters)
+segmentize = 5          # densify the source contour lines to this vertex spacing (meters) for the index
+method = 'index'        # 'index' or 'raster'
+raster_resolution = 2.5 # cell size of the nearest-contour raster (meters)
 
 # ---------------------------------------------
 
 source_geojson = base_path + '1912/skeleton_1912_heights.geojson'
+index_path = base_path + '1912/skeleton_1912_heights_index.pkl'
+raster_path = base_path + '1912/skeleton_1912_heights_raster.npz'
+
+height_index = None
 
 for year in years:
     target_geojson = base_path + f'{year}/skeleton_{year}.geojson'
@@ -25,7 +36,15 @@ for year in years:
         print(f"Warning: {output_geojson} already exists.")
     
     
-    if not os.path.exists(target_geojson) or overwrite == True:
-    
-        assign_heights(source_geojson=source_geojson, target_geojson=target_geojson, output_geojson=output_geojson)
+    if not os.path.exists(output_geojson) or overwrite == True:
 
+        if method == 'raster':
+            if height_index is None:
+                height_index = build_height_raster(source_geojson, raster_resolution, margin=max_distance, cache_path=raster_path)
+
+            assign_heights_raster(height_index, target_geojson=target_geojson, output_geojson=output_geojson, max_distance=max_distance)
+        else:
+            if height_index is None:
+                height_index = build_height_index(source_geojson, segmentize=segmentize, cache_path=index_path)
+    
+            assign_heights_indexed(height_index, target_geojson=target_geojson, output_geojson=output_geojson, max_distance=max_distance)
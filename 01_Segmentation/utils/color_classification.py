@@ -0,0 +1,209 @@
+import numpy as np
+import hashlib
+import inspect
+import os
+import pickle
+
+
+"""
+Colour classification of map sheets with a precomputed RGB lookup table (LUT).
+The LUT maps every RGB value (quantized to `bits` bits per channel) to a class id, so that classifying a sheet is a
+single table gather per pixel without any float conversion.
+"""
+
+
+# Class ids
+BACKGROUND, CONTOUR, WATER = 0, 1, 2
+
+
+def rgb_grid(bits=8):
+    """
+    Returns the RGB values represented by the cells of a LUT, as broadcastable arrays.
+
+    Parameters:
+    bits (int): Bits per channel of the LUT (e.g. 6 for 64^3 cells, 8 for 256^3 cells).
+
+    Returns:
+    tuple: (R, G, B) uint8 arrays of shape (n, 1, 1), (1, n, 1) and (1, 1, n), the centre value of every cell.
+    """
+    n = 1 << bits
+    step = 256 // n
+    values = (np.arange(n) * step + step // 2).astype(np.uint8)
+    return values[:, None, None], values[None, :, None], values[None, None, :]
+
+
+def build_threshold_lut(rules, bits=8):
+    """
+    Builds a LUT from threshold rules on the RGB values.
+
+    Parameters:
+    rules (list): (class_id, rule) pairs, rule(R, G, B) returning a boolean array for uint8 channel arrays.
+        Later rules overwrite earlier ones, cells matching no rule are BACKGROUND.
+    bits (int): Bits per channel of the LUT.
+
+    Returns:
+    ndarray: uint8 LUT of shape (2^bits, 2^bits, 2^bits).
+    """
+    R, G, B = rgb_grid(bits)
+    n = 1 << bits
+    lut = np.full((n, n, n), BACKGROUND, np.uint8)
+    for class_id, rule in rules:
+        lut[np.broadcast_to(rule(R, G, B), lut.shape)] = class_id
+    return lut
+
+
+def contour_threshold_lut(threshold_B=100, threshold_V=102, bits=8):
+    """
+    LUT reproducing mask_image followed by flood_fill: pixels with B <= threshold_B and max(R, G, B) > threshold_V
+    are CONTOUR. With bits=8 the classification is identical to that path.
+
+    Parameters:
+    threshold_B (int): Maximum value of the blue channel.
+    threshold_V (int): HSV value threshold (value * 255).
+    bits (int): Bits per channel of the LUT.
+
+    Returns:
+    ndarray: uint8 LUT.
+    """
+    def contour(R, G, B):
+        return (B <= threshold_B) & (np.maximum(np.maximum(R, G), B) > threshold_V)
+
+    return build_threshold_lut([(CONTOUR, contour)], bits)
+
+
+def sample_colors(image, points, radius=2):
+    """
+    Collects the colours of the pixels around sample points.
+
+    Parameters:
+    image (ndarray): RGB image (uint8).
+    points (list): Sample points (row, col).
+    radius (int): Half size of the square window around every point.
+
+    Returns:
+    ndarray: (N, 3) uint8 RGB samples.
+    """
+    samples = []
+    for row, col in points:
+        window = image[max(row - radius, 0):row + radius + 1, max(col - radius, 0):col + radius + 1]
+        samples.append(window.reshape(-1, 3))
+    return np.concatenate(samples)
+
+
+def build_sample_lut(samples, bits=6, max_distance=None):
+    """
+    Builds a LUT from colour samples: every cell gets the class of the nearest class centroid (in RGB).
+
+    Parameters:
+    samples (dict): (N, 3) RGB samples per class id, e.g. from sample_colors.
+    bits (int): Bits per channel of the LUT.
+    max_distance (float, optional): Cells farther than this from every centroid are BACKGROUND.
+
+    Returns:
+    ndarray: uint8 LUT of shape (2^bits, 2^bits, 2^bits).
+    """
+    class_ids = np.array(list(samples.keys()), np.uint8)
+    centroids = np.array([np.asarray(s, np.float32).reshape(-1, 3).mean(axis=0) for s in samples.values()])
+
+    R, G, B = (c.astype(np.float32) for c in rgb_grid(bits))
+    n = 1 << bits
+    best = np.full((n, n, n), np.inf, np.float32)
+    lut = np.full((n, n, n), BACKGROUND, np.uint8)
+    for class_id, (r, g, b) in zip(class_ids, centroids):
+        distance = (R - r) ** 2 + (G - g) ** 2 + (B - b) ** 2
+        closer = distance < best
+        best[closer] = distance[closer]
+        lut[closer] = class_id
+    if max_distance is not None:
+        lut[best > max_distance ** 2] = BACKGROUND
+    return lut
+
+
+def lut_cache_key(build, *args, **kwargs):
+    """
+    Identifies a LUT by its builder and the builder arguments (defaults included).
+
+    Parameters:
+    build (function): LUT builder.
+    *args, **kwargs: Arguments of the builder.
+
+    Returns:
+    str: SHA-1 of the builder's name and source code and of the pickled arguments.
+    """
+    arguments = inspect.signature(build).bind(*args, **kwargs)
+    arguments.apply_defaults()
+    try:
+        source = inspect.getsource(build)
+    except (OSError, TypeError):
+        source = build.__code__.co_code
+    key = (build.__module__, build.__qualname__, source, sorted(arguments.arguments.items()))
+    return hashlib.sha1(pickle.dumps(key, protocol=4)).hexdigest()
+
+
+def load_or_build_lut(cache_path, build, *args, **kwargs):
+    """
+    Loads a LUT from disk or builds and stores it (one cache file per map edition).
+    The cache file name gets the key of the builder and its arguments (see lut_cache_key), e.g.
+    color_lut_1899_<sha1>.npy for cache_path color_lut_1899.npy, so other thresholds or bit depths build a new LUT.
+
+    Parameters:
+    cache_path (str): Path of the .npy cache file, None to disable caching.
+    build (function): LUT builder, e.g. contour_threshold_lut or build_sample_lut.
+    *args, **kwargs: Arguments of the builder.
+
+    Returns:
+    ndarray: uint8 LUT.
+    """
+    if cache_path:
+        root, ext = os.path.splitext(cache_path)
+        cache_path = f"{root}_{lut_cache_key(build, *args, **kwargs)}{ext or '.npy'}"
+        if os.path.exists(cache_path):
+            return np.load(cache_path)
+
+    lut = build(*args, **kwargs)
+    if cache_path:
+        np.save(cache_path, lut)
+        print(f"Colour LUT saved to {cache_path}")
+    return lut
+
+
+def classify_image(image, lut, tile_rows=1024):
+    """
+    Classifies every pixel of an RGB image with a LUT, tile by tile.
+
+    Parameters:
+    image (ndarray): RGB image (uint8).
+    lut (ndarray): LUT of shape (2^bits, 2^bits, 2^bits).
+    tile_rows (int): Number of image rows classified at once.
+
+    Returns:
+    ndarray: uint8 class id per pixel.
+    """
+    bits = int(np.log2(lut.shape[0]))
+    shift = 8 - bits
+    flat_lut = lut.ravel()
+    height, width = image.shape[:2]
+    classes = np.empty((height, width), np.uint8)
+
+    for row in range(0, height, tile_rows):
+        tile = image[row:row + tile_rows]
+        index = (tile[..., 0] >> shift).astype(np.int32) << (2 * bits)
+        index |= (tile[..., 1] >> shift).astype(np.int32) << bits
+        index |= tile[..., 2] >> shift
+        np.take(flat_lut, index, out=classes[row:row + tile_rows])
+
+    return classes
+
+
+def class_masks(classes, class_ids):
+    """
+    Splits a class map into boolean masks.
+
+    Parameters:
+    classes (ndarray): Class id per pixel (see classify_image).
+    class_ids (list): Class ids to return masks for.
+
+    Returns:
+    dict: Boolean mask per class id.
+    """
+    return {class_id: classes == class_id for class_id in class_ids}
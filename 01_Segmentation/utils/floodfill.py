@@ -1,44 +1,69 @@
 import numpy as np
 import matplotlib.pyplot as plt
-from skimage import color, morphology
-from skimage.segmentation import flood, flood_fill
+from skimage import morphology
+from skimage.segmentation import flood_fill
 import cv2
 import rasterio
-import json
 from shapely.geometry import LineString
 import geopandas as gpd
 from skimage.morphology import skeletonize
 from .trace_skeleton import *
-from pyproj import Transformer
+from .skeleton_graph import trace_skeleton_graph
+from .polylines import polylines_to_arrays, georeference_coords, random_colors, write_linestrings_geojson, \
+    simplify_polylines, join_polylines
 from rasterio.crs import CRS
 import random
+import multiprocessing
+from multiprocessing import shared_memory
 
-from utils.segmentation import plot_images, crop_image, mask_image, mask_flood_fill
+from utils.segmentation import plot_images, crop_image, mask_image, mask_flood_fill, hue_value_planes
 import os
+import warnings
 
 
-def flood_fill(image, seed_point, tolerance=0.5):
+def flood_fill(image, seed_point=None, tolerance=None):
+    """
+    Segments the image by its HSV value: pixels with value > 0.4 are kept.
+    The value is computed tile by tile in uint8 (see hue_value_planes). The hue flood around a seed point did not
+    contribute to the result and was removed, use mask_flood_fill for a flood from a seed.
+
+    Parameters:
+    image (ndarray): RGB image, usually the output of mask_image.
+    seed_point (tuple, optional): Deprecated and ignored.
+    tolerance (float, optional): Deprecated and ignored.
+
+    Returns:
+    ndarray: Boolean mask of the segmented pixels.
+    """
     
     print("--- flood_fill ---")
-    
-    img_test = color.rgb2hsv(image)
-    
-    # flood function returns a mask of flooded pixels
-    mask = flood(img_test[..., 0], seed_point, tolerance=tolerance)
-    
-    # Set pixels of mask to new value for hue channel
-    img_test[mask, 0] = 0
 
-    # Create a mask for red hue values: low red and high red
-    low_red_mask = img_test[..., 2] > 0.4
+    if seed_point is not None or tolerance is not None:
+        warnings.warn("flood_fill ignores seed_point and tolerance, they will be removed.", DeprecationWarning,
+                      stacklevel=2)
+    
+    _, value = hue_value_planes(image, hue=False)
 
-    # Combine both masks to capture all red pixels (low and high red hues)
-    flood_result = low_red_mask 
+    # value > 0.4 in uint8 (0.4 * 255 = 102)
+    flood_result = value > 102
 
     return flood_result
 
 
-def find_connected_components(mask, blob_threshold_size=12, dilate_kernel_size=5):
+def find_connected_components(mask, blob_threshold_size=12, dilate_kernel_size=5, min_aspect_ratio=None, max_aspect_ratio=None):
+    """
+    Removes small connected components from a mask and dilates the result.
+
+    Parameters:
+    mask (ndarray): Binary mask.
+    blob_threshold_size (int): Minimum area of a component in pixels.
+    dilate_kernel_size (int): Size of the square dilation kernel.
+    min_aspect_ratio (float, optional): Minimum aspect ratio (long / short side) of the bounding box of a component.
+    max_aspect_ratio (float, optional): Maximum aspect ratio of the bounding box of a component.
+
+    Returns:
+    ndarray: Filtered and dilated mask (0/255 uint8).
+    """
     
     print("--- find_connected_components ---")
 
@@ -49,13 +74,19 @@ def find_connected_components(mask, blob_threshold_size=12, dilate_kernel_size=5
     # Label connected components
     num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(mask_uint8, connectivity=8)
 
-    # Create a new image to store the filtered output
-    filtered_img = np.zeros_like(mask_uint8)
+    # Keep/drop decision per label, applied to all pixels with a single lookup
+    keep = stats[:, cv2.CC_STAT_AREA] >= blob_threshold_size
+    if min_aspect_ratio is not None or max_aspect_ratio is not None:
+        sides = stats[:, [cv2.CC_STAT_WIDTH, cv2.CC_STAT_HEIGHT]]
+        aspect_ratio = sides.max(axis=1) / np.maximum(sides.min(axis=1), 1)
+        if min_aspect_ratio is not None:
+            keep &= aspect_ratio >= min_aspect_ratio
+        if max_aspect_ratio is not None:
+            keep &= aspect_ratio <= max_aspect_ratio
+    keep[0] = False  # background
 
-    # Keep only components larger than blob_threshold_size
-    for i in range(1, num_labels):  # Start from 1 to skip the background
-        if stats[i, cv2.CC_STAT_AREA] >= blob_threshold_size:
-            filtered_img[labels == i] = 255
+    lut = np.where(keep, 255, 0).astype(np.uint8)
+    filtered_img = lut[labels]
 
     # Apply a morphological closing operation to fill small holes        
     kernel = np.ones((dilate_kernel_size,dilate_kernel_size),np.uint8)
@@ -66,139 +97,348 @@ def find_connected_components(mask, blob_threshold_size=12, dilate_kernel_size=5
 
     return dilated_filtered_img
 
-def skeletonize_image(mask,save_path=None):
-    
-    print("--- skeletonize_image ---")
-    
+def dilated_centerlines(mask):
+    # first stage of skeletonize_image: skeletonize (Lee) and dilate with a 5x5 kernel three times
+
     # Perform skeletonization to get the centerline of the shapes
     skeleton_lee = morphology.skeletonize(mask,method='lee')
 
     # remove small blobs using a morphological dilation operation
     kernel = np.ones((5,5),np.uint8)
-    skeleton_dilated = cv2.dilate(skeleton_lee.astype(np.uint8), kernel, iterations=3)
-    
+    return cv2.dilate(skeleton_lee.astype(np.uint8), kernel, iterations=3)
+
+def skeletonize_mask(mask):
+    # centerlines of the mask, see skeletonize_image
+
     # Perform again skeletonization to get the centerline of the shapes
-    skeleton2 = morphology.skeletonize(skeleton_dilated)
+    return morphology.skeletonize(dilated_centerlines(mask))
+
+# reach of the 5x5 dilation applied three times in dilated_centerlines
+DILATION_REACH = 6
+
+def thinning_reach(mask):
+    """
+    Margin a window needs around a tile so that thinning the window gives the same result inside the tile as
+    thinning the whole mask. Thinning peels one layer of pixels per iteration and a cut at the window border can
+    change the result at most one pixel further inward per peeling step, so twice the largest L1 distance of a mask
+    pixel to the background (the number of iterations) plus a small margin is enough.
+
+    Parameters:
+    mask (ndarray): Binary mask.
+
+    Returns:
+    int: Margin in pixels, at least 510 where a shape is 255 pixels or more from its border.
+    """
+    mask = (np.asarray(mask) > 0).astype(np.uint8)
+    if not mask.any():
+        return 0
+    # uint8 distances (saturating at 255) keep the memory at one byte per pixel
+    distance = cv2.distanceTransform(mask, cv2.DIST_L1, 3, dstType=cv2.CV_8U)
+    return 2 * int(distance.max()) + 2
+
+
+# shared arrays of the tile workers of skeletonize_image
+skeleton_shared = {}
+
+def init_skeleton_worker(specs):
+    # attach a tile worker to the shared arrays, given as {key: (shared memory name, shape, dtype)}
+    for key, (name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=name)
+        skeleton_shared[key + '_shm'] = shm  # keep the mapping alive
+        skeleton_shared[key] = np.ndarray(shape, dtype, buffer=shm.buf)
+
+def skeletonize_tile(task):
+    # run one stage of skeletonize_image on a tile with its halo and write the tile without the halo
+    stage, (row0, row1, col0, col1), (halo_row0, halo_row1, halo_col0, halo_col1) = task
+    source, target = ('mask', 'dilated') if stage == 0 else ('dilated', 'skeleton')
+    window = skeleton_shared[source][halo_row0:halo_row1, halo_col0:halo_col1]
+    if not window.any():
+        return
+    result = dilated_centerlines(window) if stage == 0 else morphology.skeletonize(window)
+    skeleton_shared[target][row0:row1, col0:col1] = \
+        result[row0 - halo_row0:row1 - halo_row0, col0 - halo_col0:col1 - halo_col0]
+
+def skeleton_tiles(stage, shape, tile_size, halo):
+    # tasks of one stage of the tiled skeletonize_image
+    height, width = shape
+    tasks = []
+    for row0 in range(0, height, tile_size):
+        for col0 in range(0, width, tile_size):
+            row1, col1 = min(row0 + tile_size, height), min(col0 + tile_size, width)
+            tasks.append((stage, (row0, row1, col0, col1),
+                          (max(row0 - halo, 0), min(row1 + halo, height), max(col0 - halo, 0), min(col1 + halo, width))))
+    return tasks
+
+def skeletonize_image(mask,save_path=None,tile_size=None,processes=None):
+    """
+    Computes the centerlines of the mask: skeletonize (Lee), dilate with a 5x5 kernel three times and skeletonize again.
+
+    Parameters:
+    mask (ndarray): Binary mask, e.g. the output of find_connected_components.
+    save_path (str, optional): Path to save the skeleton as image.
+    tile_size (int, optional): If set, both thinning stages run in tiles of this size on a process pool. Every tile is
+        thinned with a margin that is cropped again, derived from the widest shape of the stage (see thinning_reach,
+        plus the reach of the dilation for the first stage), so the result equals the single pass. A stage whose
+        margin is larger than tile_size (e.g. where close lines merge into one wide blob after the dilation) runs as
+        a single pass.
+    processes (int, optional): Number of worker processes, None for all cores, 1 for a single pass.
+
+    Returns:
+    ndarray: Boolean skeleton.
+    """
+    
+    print("--- skeletonize_image ---")
+    
+    height, width = mask.shape
+    if not tile_size or processes == 1 or (height <= tile_size and width <= tile_size):
+        skeleton2 = skeletonize_mask(mask)
+    else:
+        mask = np.asarray(mask)
+        specs, buffers = {}, []
+        try:
+            shared = {}
+            for key, dtype in (('mask', mask.dtype), ('dilated', np.uint8), ('skeleton', bool)):
+                shm = shared_memory.SharedMemory(create=True, size=max(height * width * np.dtype(dtype).itemsize, 1))
+                buffers.append(shm)
+                specs[key] = (shm.name, mask.shape, dtype)
+                shared[key] = np.ndarray(mask.shape, dtype, buffer=shm.buf)
+            shared['mask'][...] = mask
+            shared['dilated'][...] = 0
+            shared['skeleton'][...] = False
+
+            with multiprocessing.Pool(processes, initializer=init_skeleton_worker, initargs=(specs,)) as pool:
+                # stage 1: Lee skeleton and dilation, exact up to the reach of the thinning plus the dilation
+                halo = thinning_reach(mask) + DILATION_REACH
+                if halo > tile_size:
+                    print(f"Halo of {halo} pixels for the first stage, skeletonizing it in a single pass.")
+                    shared['dilated'][...] = dilated_centerlines(mask)
+                else:
+                    pool.map(skeletonize_tile, skeleton_tiles(0, mask.shape, tile_size, halo), chunksize=1)
+
+                # stage 2: skeleton of the dilated centerlines, where close lines may have merged into wide blobs
+                halo = thinning_reach(shared['dilated'])
+                if halo > tile_size:
+                    print(f"Halo of {halo} pixels for the second stage, skeletonizing it in a single pass.")
+                    shared['skeleton'][...] = morphology.skeletonize(shared['dilated'])
+                else:
+                    pool.map(skeletonize_tile, skeleton_tiles(1, mask.shape, tile_size, halo), chunksize=1)
+
+            skeleton2 = shared['skeleton'].copy()
+            del shared  # release the views before closing the shared memory
+        finally:
+            for shm in buffers:
+                shm.close(); shm.unlink()
     
     if save_path:
         plt.imsave(save_path, skeleton2, cmap='gray')
     
     return skeleton2
 
-def plot_skeleton_trace(skeleton_img_path,iterations=999):
+
+def coarse_contour_counts(image, factor=8, threshold_B=100, threshold_V=102, tile_rows=1024):
+    """
+    Candidates of mask_image + flood_fill at a decimated level: counts per block of factor x factor pixels the pixels
+    with B <= threshold_B and max(R, G, B) > threshold_V. Blocks with a count > 0 are a conservative mask, no contour
+    pixel of the full resolution mask lies outside them.
+
+    Parameters:
+    image (ndarray): RGB image (uint8).
+    factor (int): Block size (decimation factor).
+    threshold_B (int): Blue threshold of mask_image.
+    threshold_V (int): Value threshold of flood_fill (value * 255).
+    tile_rows (int): Number of image rows processed at once (rounded up to a multiple of factor).
+
+    Returns:
+    ndarray: int32 counts of shape (ceil(height / factor), ceil(width / factor)).
+    """
+    height, width = image.shape[:2]
+    coarse_height, coarse_width = -(-height // factor), -(-width // factor)
+    coarse = np.zeros((coarse_height, coarse_width), np.int32)
+    tile_rows = -(-tile_rows // factor) * factor
+
+    for row in range(0, height, tile_rows):
+        tile = image[row:row + tile_rows]
+        candidate = (tile[..., 2] <= threshold_B) & (tile.max(axis=2) > threshold_V)
+        # pad to full blocks and sum every block
+        rows, cols = candidate.shape
+        padded = np.zeros((-(-rows // factor) * factor, coarse_width * factor), np.int32)
+        padded[:rows, :cols] = candidate
+        blocks = padded.reshape(padded.shape[0] // factor, factor, coarse_width, factor).sum(axis=(1, 3))
+        coarse[row // factor:row // factor + blocks.shape[0]] = blocks
+
+    return coarse
+
+
+def segment_roi(image, factor=8, halo=32, blob_threshold_size=12, dilate_kernel_size=5):
+    """
+    Coarse-to-fine segmentation: mask_image, flood_fill, find_connected_components and skeletonize_image run only
+    inside candidate regions found at a decimated level (see coarse_contour_counts), grown by a halo.
+    Every region is processed in its own window, restricted to the region, so components are never cut. Regions with
+    fewer candidate pixels than blob_threshold_size cannot hold a kept component and are skipped. With a halo
+    larger than the reach of the morphological operations (about 16 pixels) the skeleton equals the full
+    resolution result.
+
+    Parameters:
+    image (ndarray): RGB image (uint8).
+    factor (int): Decimation factor of the candidate search.
+    halo (int): Margin in pixels around candidate pixels.
+    blob_threshold_size (int): Minimum component size of find_connected_components.
+    dilate_kernel_size (int): Dilation kernel size of find_connected_components.
+
+    Returns:
+    ndarray: Boolean skeleton of the full image.
+    """
+    print("--- segment_roi ---")
+
+    height, width = image.shape[:2]
+    counts = coarse_contour_counts(image, factor)
+
+    # grow the candidates by the halo (in blocks) and split them into connected regions
+    radius = -(-halo // factor)
+    kernel = np.ones((2 * radius + 1, 2 * radius + 1), np.uint8)
+    regions = cv2.dilate((counts > 0).astype(np.uint8), kernel)
+    num_regions, labels, stats, _ = cv2.connectedComponentsWithStats(regions, connectivity=8)
+    region_counts = np.bincount(labels.ravel(), weights=counts.ravel(), minlength=num_regions)
+    selected = [i for i in range(1, num_regions) if region_counts[i] >= blob_threshold_size]
+
+    print(f"{len(selected)} candidate regions cover {100 * stats[selected, cv2.CC_STAT_AREA].sum() / regions.size:.1f}% of the map.")
+
+    skeleton = np.zeros((height, width), bool)
+    for i in selected:
+        x, y, w, h = stats[i, :4]
+        row0, col0 = y * factor, x * factor
+        row1, col1 = min((y + h) * factor, height), min((x + w) * factor, width)
+
+        # pixels of this region only, other regions in the same bounding box are left out
+        region = np.repeat(np.repeat(labels[y:y + h, x:x + w] == i, factor, axis=0), factor, axis=1)
+        region = region[:row1 - row0, :col1 - col0]
+        window = image[row0:row1, col0:col1] * region[..., None].astype(np.uint8)
+
+        flood_result = flood_fill(mask_image(window))
+        connected_result = find_connected_components(flood_result, blob_threshold_size, dilate_kernel_size)
+        skeleton[row0:row1, col0:col1] |= skeletonize_image(connected_result) & region
+
+    return skeleton
+
+def read_skeleton(skeleton):
+    """
+    Loads a skeleton for tracing.
+
+    Parameters:
+    skeleton (ndarray or str): Skeleton array (e.g. the output of skeletonize_image) or path to a skeleton image.
+
+    Returns:
+    tuple: (im0, im) with im0 the BGR image to draw on and im the one pixel wide binary skeleton (0/1 uint8).
+    """
+    if isinstance(skeleton, np.ndarray):
+        im = (skeleton > 0).astype(np.uint8)
+        im0 = cv2.cvtColor(im * 255, cv2.COLOR_GRAY2BGR)
+    else:
+        assert os.path.exists(skeleton), f"File {skeleton} not found."
+        im0 = cv2.imread(skeleton)
+        # Binarize the skeleton image
+        im = (im0[:,:,0] > 128).astype(np.uint8)
+
+    # Thin the image (skeletonize stops after one pass if it is already one pixel wide)
+    im = thinning(im)
+
+    return im0, im
+
+def plot_skeleton_trace(skeleton,iterations=999):
     
     print("--- plot_skeleton_trace ---")
 
-    im0 = cv2.imread(skeleton_img_path)
-    im = (im0[:,:,0]>128).astype(np.uint8)
-
-    im = thinning(im)
+    im0, im = read_skeleton(skeleton)
 
     rects = []
     polys = traceSkeleton(im,0,0,im.shape[1],im.shape[0],10,iterations,rects)
 
     for l in polys:
         c = (200*random.random(),200*random.random(),200*random.random())
-        for i in range(0,len(l)-1):
-            cv2.line(im0,(l[i][0],l[i][1]),(l[i+1][0],l[i+1][1]),c)
+        cv2.polylines(im0,[np.array(l,np.int32)],False,c)
 
     plt.imshow(im0)
     
-def skeleton_trace(skeleton_img_path,original_img_path,output_path_geojson,iterations=999,overwrite=False,crs='EPSG:21781'):
+def skeleton_trace(skeleton,original_img_path,output_path_geojson,iterations=999,overwrite=False,crs='EPSG:21781',tile_size=None,processes=None,engine='recursive',time_budget=None,
+                   simplify_tolerance=None,join_gap=None,join_max_angle=45):
+    """
+    Traces the skeleton into polylines and saves them as GeoJSON in EPSG:2056.
+
+    Parameters:
+    skeleton (ndarray or str): Skeleton array (e.g. the output of skeletonize_image) or path to a skeleton image.
+    original_img_path (str): Path to the georeferenced map the skeleton was extracted from.
+    output_path_geojson (str): Path of the output GeoJSON file.
+    iterations (int): Maximum recursion depth of the 'recursive' engine.
+    overwrite (bool): Overwrite an existing output file.
+    crs (str, optional): CRS of the map, None to use the CRS of the map file.
+    tile_size (int, optional): If set, the skeleton is traced in tiles of at most this size on a process pool
+        (see traceSkeletonTiled). The result is identical to the serial trace.
+    processes (int, optional): Number of worker processes for the tiled trace, None for all cores.
+    engine (str): 'recursive' (traceSkeleton), 'queue' (traceSkeletonQueue, no depth limit, tile_size is ignored)
+        or 'graph' (trace_skeleton_graph, linear time, polylines split exactly at junctions).
+    time_budget (float, optional): Seconds after which the 'queue' engine stops refining and returns a coarser trace.
+    simplify_tolerance (float, optional): Simplify the polylines with this tolerance in meters (see simplify_polylines).
+    join_gap (float, optional): Join polylines whose ends are closer than this in meters and continue each other
+        (see join_polylines).
+    join_max_angle (float): Maximum deviation from a straight continuation of joined polylines in degrees.
+
+    Returns:
+    ndarray: The skeleton image with the traced polylines drawn in random colors.
+    """
     
     print("--- skeleton_trace ---")
     
-    assert os.path.exists(skeleton_img_path), f"File {skeleton_img_path} not found."
-    
     # Check if the output GeoJSON file already exists
     if os.path.exists(output_path_geojson) and not overwrite:
         print(f"File {output_path_geojson} already exists. Please choose a different file name or delete the existing file.")
         return
 
-    # Read the pixel size (resolution) from the TIFF file using rasterio
+    # Read the georeferencing of the map
     with rasterio.open(original_img_path) as src:
         transform = src.transform
         if crs is None:
             crs = src.crs  # Get the coordinate reference system (CRS)
-        pixel_width = transform[0]  # Size of a pixel in the x direction (in meters)
-        pixel_height = abs(transform[4])  # Size of a pixel in the y direction (in meters)
-
-        # Get the coordinates of the bottom-left corner (0, height in pixel coordinates)
-        bottom_left_x, bottom_left_y = transform * (0, src.height)
-        
-    # Create a transformer to convert from EPSG:21781 (if that's the original CRS) to EPSG:2056
-    transformer = Transformer.from_crs(crs, CRS.from_epsg(2056), always_xy=True)
 
-    # Convert the bottom-left coordinates to EPSG:2056
-    bottom_left_x, bottom_left_y = transformer.transform(bottom_left_x, bottom_left_y)
-
-    # Constants to convert image coordinates to EPSG:2056
-    LON_CONSTANT = bottom_left_x  # Adjust to the correct EPSG:2056 longitude base
-    LAT_CONSTANT = bottom_left_y  # Adjust to the correct EPSG:2056 latitude base
-
-
-    im0 = cv2.imread(skeleton_img_path)
-
-    # Binarize the skeleton image
-    im = (im0[:,:,0] > 128).astype(np.uint8)
+    im0, im = read_skeleton(skeleton)
 
     # Get image dimensions
     height, width = im.shape
 
-    # Thin the image
-    im = thinning(im)
-
     # Trace the skeleton to get line coordinates
     rects = []
-    polys = traceSkeleton(im, 0, 0, width, height, 10, 500, rects)
-
-    # Convert image coordinates to EPSG:2056 and store in GeoJSON format
-    features = []
-    for l in polys:
-        coordinates = []
-        for coord in l:
-            # Flip Y axis by subtracting the pixel's y-coordinate from the image height
-            flipped_y = height - coord[1]
-
-            # Apply pixel size to convert image coordinates to real-world distances
-            scaled_x = coord[0] * pixel_width  # Apply pixel width scaling
-            scaled_y = flipped_y * pixel_height  # Apply pixel height scaling
-            
-            # Convert image coordinates to EPSG:2056 by adding the constants
-            lon = scaled_x + LON_CONSTANT  # X-axis (longitude/easting)
-            lat = scaled_y + LAT_CONSTANT  # Y-axis (latitude/northing)
-
-            coordinates.append([lon, lat])
-
-        # Create a GeoJSON feature for each line
-        feature = {
-            "type": "Feature",
-            "geometry": {
-                "type": "LineString",
-                "coordinates": coordinates
-            },
-            "properties": {
-                "color": f"rgb({200*random.random()}, {200*random.random()}, {200*random.random()})"
-            }
-        }
-        features.append(feature)
-
-    # Create GeoJSON structure
-    geojson_data = {
-        "type": "FeatureCollection",
-        "features": features
-    }
-
-    with open(output_path_geojson, 'w') as geojson_file:
-        json.dump(geojson_data, geojson_file, indent=2)
+    if engine == 'queue':
+        pending = []
+        polys = traceSkeletonQueue(im, 0, 0, width, height, 10, rects, time_budget, pending)
+        if pending:
+            print(f"Time budget of {time_budget}s spent, {len(pending)} chunks were traced coarsely.")
+    elif engine == 'graph':
+        polys = trace_skeleton_graph(im)
+    elif engine == 'recursive':
+        if tile_size:
+            polys = traceSkeletonTiled(im, 0, 0, width, height, 10, iterations, rects, tile_size, processes)
+        else:
+            polys = traceSkeleton(im, 0, 0, width, height, 10, iterations, rects)
+    else:
+        raise ValueError("Invalid engine. Choose 'recursive', 'queue' or 'graph'.")
+
+    # Convert image coordinates to EPSG:2056 in one batch and stream them to GeoJSON
+    coords, offsets = polylines_to_arrays(polys)
+    coords = georeference_coords(coords, transform, crs, CRS.from_epsg(2056))
+    if join_gap:
+        coords, offsets = join_polylines(coords, offsets, join_gap, join_max_angle)
+    if simplify_tolerance:
+        coords, offsets = simplify_polylines(coords, offsets, simplify_tolerance)
+    print(f"{len(offsets) - 1} polylines with {len(coords)} vertices.")
+    colors = random_colors(len(offsets) - 1)
+
+    write_linestrings_geojson(output_path_geojson, coords, offsets, colors)
 
     print(f"GeoJSON saved as {output_path_geojson}")
 
     # Optionally, display the image with colored lines
     for l in polys:
         c = (200*random.random(), 200*random.random(), 200*random.random())
-        for i in range(0, len(l) - 1):
-            cv2.line(im0, (l[i][0], l[i][1]), (l[i+1][0], l[i+1][1]), c)
+        cv2.polylines(im0, [np.array(l, np.int32)], False, c)
 
     return im0
 
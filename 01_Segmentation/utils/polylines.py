@@ -0,0 +1,216 @@
+import numpy as np
+import json
+import shapely
+from scipy.spatial import cKDTree
+from pyproj import Transformer
+
+
+def polylines_to_arrays(polylines):
+    """
+    Packs polylines into one flat coordinate array.
+
+    Parameters:
+    polylines (list): Polylines as lists of [x, y] coordinates.
+
+    Returns:
+    tuple: (coords, offsets) with coords an (N, 2) float64 array of all vertices and offsets an int64 array of
+        length len(polylines) + 1, polyline i being coords[offsets[i]:offsets[i + 1]].
+    """
+    lengths = np.array([len(l) for l in polylines], np.int64)
+    offsets = np.zeros(len(polylines) + 1, np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    if offsets[-1] == 0:
+        return np.zeros((0, 2)), offsets
+
+    coords = np.concatenate([np.asarray(l, np.float64).reshape(-1, 2) for l in polylines if len(l)])
+    return coords, offsets
+
+
+def georeference_coords(coords, transform, src_crs, dst_crs='EPSG:2056'):
+    """
+    Converts pixel coordinates to map coordinates in one batch.
+
+    Parameters:
+    coords (ndarray): (N, 2) pixel coordinates (x = column, y = row, pixel corners).
+    transform (Affine): Affine transform of the raster (rasterio).
+    src_crs: CRS of the raster.
+    dst_crs: CRS of the output coordinates.
+
+    Returns:
+    ndarray: (N, 2) float64 map coordinates.
+    """
+    a, b, c, d, e, f = transform[:6]
+    cols, rows = coords[:, 0], coords[:, 1]
+    x = a * cols + b * rows + c
+    y = d * cols + e * rows + f
+
+    transformer = Transformer.from_crs(src_crs, dst_crs, always_xy=True)
+    x, y = transformer.transform(x, y)
+    return np.stack([np.asarray(x, np.float64), np.asarray(y, np.float64)], axis=1)
+
+
+def random_colors(n, seed=None):
+    """
+    Draws random colors as used for the traced polylines.
+
+    Parameters:
+    n (int): Number of colors.
+    seed (int, optional): Seed of the random generator.
+
+    Returns:
+    ndarray: (n, 3) float array with values in [0, 200).
+    """
+    return 200 * np.random.default_rng(seed).random((n, 3))
+
+
+def write_linestrings_geojson(output_path, coords, offsets, colors=None):
+    """
+    Writes polylines as a GeoJSON FeatureCollection of LineStrings.
+    Features are streamed to the file one by one in compact form, the full collection is never built in memory.
+
+    Parameters:
+    output_path (str): Path of the output GeoJSON file.
+    coords (ndarray): (N, 2) coordinates of all vertices (see polylines_to_arrays).
+    offsets (ndarray): Start offset of every polyline in coords, plus the total number of vertices.
+    colors (ndarray, optional): (M, 3) color per polyline, stored as "color" property "rgb(r, g, b)".
+
+    Returns:
+    None
+    """
+    encoder = json.JSONEncoder(separators=(',', ':'))
+
+    with open(output_path, 'w') as f:
+        f.write('{"type":"FeatureCollection","features":[')
+        for i in range(len(offsets) - 1):
+            if i:
+                f.write(',')
+            line = coords[offsets[i]:offsets[i + 1]].tolist()
+            f.write('{"type":"Feature","geometry":{"type":"LineString","coordinates":')
+            f.write(encoder.encode(line))
+            if colors is not None:
+                r, g, b = colors[i]
+                f.write(f'}},"properties":{{"color":"rgb({r}, {g}, {b})"}}}}')
+            else:
+                f.write('},"properties":{}}')
+        f.write(']}\n')
+
+
+def simplify_polylines(coords, offsets, tolerance, preserve_topology=True):
+    """
+    Simplifies all polylines at once (Douglas-Peucker, vectorized in shapely/GEOS).
+
+    Parameters:
+    coords (ndarray): (N, 2) coordinates of all vertices (see polylines_to_arrays).
+    offsets (ndarray): Start offset of every polyline in coords, plus the total number of vertices.
+    tolerance (float): Maximum distance of the simplified lines from the original vertices, in coordinate units.
+    preserve_topology (bool): Keep closed rings and lines from collapsing.
+
+    Returns:
+    tuple: (coords, offsets) of the simplified polylines. Polylines with less than 2 vertices are dropped.
+    """
+    lengths = np.diff(offsets)
+    valid = lengths >= 2
+    index = np.repeat(np.arange(valid.sum()), lengths[valid])
+    keep = np.repeat(valid, lengths)
+
+    if not valid.any():
+        return np.zeros((0, 2)), np.zeros(1, np.int64)
+
+    lines = shapely.linestrings(coords[keep], indices=index)
+    lines = shapely.simplify(lines, tolerance, preserve_topology=preserve_topology)
+    coords, index = shapely.get_coordinates(lines, return_index=True)
+
+    offsets = np.zeros(len(lines) + 1, np.int64)
+    np.cumsum(np.bincount(index, minlength=len(lines)), out=offsets[1:])
+    return coords, offsets
+
+
+def _end_directions(line, reach):
+    # outward unit directions at the start and the end of a line, measured to the first vertex at least reach away
+    directions = []
+    for end, inner in ((line[0], line[1:]), (line[-1], line[-2::-1])):
+        distance = np.hypot(*(inner - end).T)
+        far = np.flatnonzero(distance >= reach)
+        vector = end - inner[far[0] if len(far) else -1]
+        norm = np.hypot(*vector)
+        directions.append(vector / norm if norm > 0 else vector)
+    return directions
+
+
+def join_polylines(coords, offsets, max_gap, max_angle=45):
+    """
+    Joins polylines whose ends are close and continue each other.
+
+    All open line ends are put into a KD-tree; two ends closer than max_gap are candidates if their outward
+    directions are opposite (within max_angle) and the gap between them follows both directions. Candidates are
+    joined greedily, closest first, every end at most once. Chains of joined lines are merged into one polyline;
+    chains that close on themselves become closed rings.
+
+    Parameters:
+    coords (ndarray): (N, 2) coordinates of all vertices (see polylines_to_arrays).
+    offsets (ndarray): Start offset of every polyline in coords, plus the total number of vertices.
+    max_gap (float): Maximum distance between joined ends, in coordinate units.
+    max_angle (float): Maximum deviation from a straight continuation in degrees.
+
+    Returns:
+    tuple: (coords, offsets) of the joined polylines.
+    """
+    lines = [coords[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+    open_lines = [i for i, l in enumerate(lines) if len(l) >= 2 and not np.array_equal(l[0], l[-1])]
+    if not open_lines:
+        return coords, offsets
+
+    # end k of line i is entry 2 * position + k (k = 0 start, k = 1 end)
+    ends = np.array([(lines[i][0], lines[i][-1]) for i in open_lines]).reshape(-1, 2)
+    directions = np.array([_end_directions(lines[i], max_gap) for i in open_lines]).reshape(-1, 2)
+
+    pairs = cKDTree(ends).query_pairs(max_gap, output_type='ndarray')
+    a, b = pairs[:, 0], pairs[:, 1]
+    min_cos = np.cos(np.radians(max_angle))
+    gap = ends[b] - ends[a]
+    gap_length = np.hypot(gap[:, 0], gap[:, 1])
+    gap_unit = gap / np.maximum(gap_length, 1e-12)[:, None]
+    compatible = (-(directions[a] * directions[b]).sum(axis=1) >= min_cos) & (
+        (gap_length == 0) | (((directions[a] * gap_unit).sum(axis=1) >= min_cos) &
+                             ((-directions[b] * gap_unit).sum(axis=1) >= min_cos)))
+
+    # greedy matching, closest ends first
+    partner = np.full(len(ends), -1)
+    for k in np.argsort(gap_length, kind='stable'):
+        if compatible[k] and partner[a[k]] < 0 and partner[b[k]] < 0:
+            partner[a[k]], partner[b[k]] = b[k], a[k]
+
+    # walk the chains, starting at free ends; the rest are closed cycles
+    visited = np.zeros(len(open_lines), bool)
+    joined = []
+
+    def walk(end):
+        chain = []
+        while True:
+            position = end // 2
+            visited[position] = True
+            line = lines[open_lines[position]]
+            line = line if end % 2 == 0 else line[::-1]  # enter at this end
+            if chain and np.array_equal(chain[-1][-1], line[0]):
+                line = line[1:]
+            chain.append(line)
+            other = end ^ 1
+            end = partner[other]
+            if end < 0 or visited[end // 2]:
+                return np.concatenate(chain)
+
+    for end in range(len(ends)):
+        if partner[end] < 0 and not visited[end // 2]:
+            joined.append(walk(end))
+    for position in range(len(open_lines)):
+        if not visited[position]:
+            chain = walk(2 * position)
+            if not np.array_equal(chain[0], chain[-1]):
+                chain = np.vstack((chain, chain[:1]))  # close the ring
+            joined.append(chain)
+
+    is_open = np.zeros(len(lines), bool)
+    is_open[open_lines] = True
+    joined += [l for i, l in enumerate(lines) if not is_open[i]]
+    return polylines_to_arrays(joined)
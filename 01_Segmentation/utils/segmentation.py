@@ -1,7 +1,7 @@
 import numpy as np
 import matplotlib.pyplot as plt
-from skimage import data, filters, color, morphology
-from skimage.segmentation import flood, flood_fill
+from skimage import data, filters, morphology
+from skimage.segmentation import flood_fill
 import cv2
 
 import numpy as np
@@ -14,6 +14,14 @@ import geopandas as gpd
 from skimage.morphology import skeletonize
 
 import geopandas as gpd
+import shapely
+from scipy.spatial import cKDTree
+import pickle
+import os
+from scipy.ndimage import distance_transform_edt
+from rasterio import features
+from rasterio.transform import from_origin, Affine
+from rasterio.crs import CRS
 
 
 
@@ -48,52 +56,127 @@ def crop_image(img, x, y, w, h):
 
 
 def mask_image(image):
-    # Split the image into R, G, B channels
-    R, G, B = cv2.split(image)
+    # Keep only pixels with a dark Blue channel (B <= 100)
     threshold_B = 100  # Adjust for Blue channel
-    _, thresh_B = cv2.threshold(B, threshold_B, 255, cv2.THRESH_BINARY)
-
-    kernel_1 = np.ones((3,3),np.uint8)
-    thresh_B_invert = 255 - thresh_B
-    B_dilation = cv2.dilate(thresh_B_invert,kernel_1,iterations = 1)
-    B_errosion = cv2.erode(B_dilation,kernel_1,iterations = 1)
+    _, thresh_B_invert = cv2.threshold(np.ascontiguousarray(image[..., 2]), threshold_B, 255, cv2.THRESH_BINARY_INV)
 
     masked_image = cv2.bitwise_and(image, image, mask=thresh_B_invert)
     
     return masked_image
 
 
-def mask_flood_fill(image, seed=(58, 24), tolerance=0.5):
+def hue_value_planes(image, tile_rows=1024, hue=True):
+    """
+    Computes the hue and value planes of an RGB image as uint8, tile by tile.
+    Unlike color.rgb2hsv, no full float64 HSV image is allocated: the memory use is 2 bytes per pixel plus one tile.
+
+    Parameters:
+    image (ndarray): RGB image (uint8).
+    tile_rows (int): Number of image rows converted at once.
+    hue (bool): Compute the hue plane. If False, only the value plane (max of R, G and B) is computed.
+
+    Returns:
+    tuple: (hue, value) uint8 planes. Hue covers the full circle with 0-255 (hue * 255 of rgb2hsv), value equals
+        rgb2hsv value * 255. hue is None if not requested.
+    """
+    height, width = image.shape[:2]
+    hue_plane = np.empty((height, width), np.uint8) if hue else None
+    value_plane = np.empty((height, width), np.uint8)
+
+    for row in range(0, height, tile_rows):
+        tile = image[row:row + tile_rows]
+        if hue:
+            hsv = cv2.cvtColor(np.ascontiguousarray(tile), cv2.COLOR_RGB2HSV_FULL)
+            hue_plane[row:row + tile_rows] = hsv[..., 0]
+            value_plane[row:row + tile_rows] = hsv[..., 2]
+        else:
+            np.max(tile, axis=2, out=value_plane[row:row + tile_rows])
+
+    return hue_plane, value_plane
+
+
+def hue_flood(hue, seed, tolerance=0.5):
+    """
+    Flood fill on a uint8 hue plane with OpenCV, the compiled equivalent of skimage flood(hue, seed, tolerance).
+
+    Parameters:
+    hue (ndarray): Hue plane (uint8, see hue_value_planes).
+    seed (tuple): Seed point coordinates (row, col).
+    tolerance (float): Tolerance on hue in the range 0-1, relative to the hue of the seed.
+
+    Returns:
+    ndarray: Boolean mask of the flooded region (8-connected).
+    """
+    height, width = hue.shape
+    mask = np.zeros((height + 2, width + 2), np.uint8)
+    diff = int(round(tolerance * 255))
+    flags = 8 | cv2.FLOODFILL_FIXED_RANGE | cv2.FLOODFILL_MASK_ONLY | (1 << 8)
+    cv2.floodFill(np.ascontiguousarray(hue), mask, (int(seed[1]), int(seed[0])), 0, diff, diff, flags)
+    return mask[1:-1, 1:-1] > 0
+
+
+def hue_flood_sweep(hue, seed, tolerances):
+    """
+    Flood fills with several tolerances (see hue_flood) on one contiguous hue plane. Tolerances that round to the
+    same hue difference share one flood.
+
+    Parameters:
+    hue (ndarray): Hue plane (uint8, see hue_value_planes).
+    seed (tuple): Seed point coordinates (row, col).
+    tolerances (list): Tolerances in the range 0-1.
+
+    Returns:
+    dict: Boolean mask of the flooded region per tolerance.
+    """
+    hue = np.ascontiguousarray(hue)
+    floods = {}
+    for tolerance in tolerances:
+        diff = int(round(tolerance * 255))
+        if diff not in floods:
+            floods[diff] = hue_flood(hue, seed, diff / 255)
+    return {tolerance: floods[int(round(tolerance * 255))] for tolerance in tolerances}
+
+
+def mask_flood_fill(image, seed=(58, 24), tolerance=0.5, tile_rows=1024):
     """
     Function to perform flood fill on an image starting from a seed point.
+    The HSV image is computed tile by tile in uint8 and the hue is flooded with OpenCV (see hue_flood), no float64
+    HSV image is allocated.
     
     Parameters:
-    image (ndarray): Input image (grayscale or RGB).
+    image (ndarray): Input RGB image (uint8).
     seed (tuple): Seed point coordinates (row, col).
-    tolerance (float): Tolerance value for flood fill.
+    tolerance (float): Tolerance value for flood fill, in the range 0-1.
+    tile_rows (int): Number of image rows converted to HSV at once.
     
     Returns:
-    mask (ndarray): Binary mask of the flooded region.
+    tuple: The uint8 HSV images (hue 0-255 over the full circle, see hue_value_planes) with the flooded pixels set to
+        hue 0 and with the post-processed mask set to hue 128 (0.5), the mask of hue 128 and the masks of the
+        post-processing steps and of the flood.
     """
     
-    img_hsv_ = color.rgb2hsv(image)
+    height, width = image.shape[:2]
+    img_hsv_ = np.empty((height, width, 3), np.uint8)
+    for row in range(0, height, tile_rows):
+        img_hsv_[row:row + tile_rows] = cv2.cvtColor(np.ascontiguousarray(image[row:row + tile_rows]),
+                                                     cv2.COLOR_RGB2HSV_FULL)
     img_hsv_copy_ = np.copy(img_hsv_)
-    # flood function returns a mask of flooded pixels
-    mask = flood(img_hsv_[..., 0], seed, tolerance=tolerance)
+    # flood on the hue plane returns a mask of flooded pixels
+    mask = hue_flood(img_hsv_[..., 0], seed, tolerance=tolerance)
     # Set pixels of mask to new value for hue channel
     img_hsv_[mask, 0] = 0
     # Post-processing in order to improve the result
-    # Remove white pixels from flag, using saturation channel
-    mask_postprocessed_1 = np.logical_and(mask, img_hsv_copy_[..., 1] > 0.05)
+    # Remove white pixels from flag, using saturation channel (0.05 * 255 = 12.75)
+    mask_postprocessed_1 = np.logical_and(mask, img_hsv_copy_[..., 1] > 12)
     # Remove thin structures with binary opening
     mask_postprocessed_2= morphology.binary_opening(mask_postprocessed_1, np.ones((3, 3)))
     # Fill small holes with binary closing
     mask_postprocessed_3 = morphology.binary_closing(mask_postprocessed_2, morphology.disk(10))
-    img_hsv_copy_[mask_postprocessed_3, 0] = 0.5
+    img_hsv_copy_[mask_postprocessed_3, 0] = 128
     
 
     # Step 6: Create a mask for only hue = 0.5
-    mask_hue_05 = img_hsv_[..., 0] == 0.5
+    mask_hue_05 = img_hsv_[..., 0] == 128
     
     return img_hsv_, img_hsv_copy_, mask_hue_05, mask_postprocessed_1, mask_postprocessed_2, mask_postprocessed_3,mask
 
@@ -144,3 +227,200 @@ def assign_heights(source_geojson, target_geojson, output_geojson, height_attr='
     target_gdf.to_file(output_geojson, driver='GeoJSON')
     
     print(f"Height values assigned and saved to {output_geojson}")
+
+
+def build_height_index(source_geojson, height_attr='height', segmentize=None, cache_path=None):
+    """
+    Builds a KD-tree over the vertices of the source contour lines, to assign their heights to other lines
+    (see assign_heights_indexed). The index can be persisted and is reused as long as the source file is unchanged.
+
+    Parameters:
+    source_geojson (str): Path to the GeoJSON file with height values.
+    height_attr (str): The attribute name in the source GeoJSON containing height information.
+    segmentize (float, optional): Densify the source lines to this maximum vertex spacing (in CRS units) first, so that
+        the nearest vertex approximates the nearest line.
+    cache_path (str, optional): Path of a pickle file to store the index in and reuse it from.
+
+    Returns:
+    dict: The index with the KD-tree ('tree'), the height per vertex ('heights') and the CRS ('crs').
+    """
+    stat = os.stat(source_geojson)
+    key = (os.path.abspath(source_geojson), stat.st_mtime, stat.st_size, height_attr, segmentize)
+
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path, 'rb') as f:
+            index = pickle.load(f)
+        if index.get('key') == key:
+            print(f"Height index loaded from {cache_path}")
+            return index
+
+    source_gdf = gpd.read_file(source_geojson)
+    geometries = source_gdf.geometry.values
+    if segmentize:
+        geometries = shapely.segmentize(geometries, segmentize)
+
+    coords, line_index = shapely.get_coordinates(geometries, return_index=True)
+    index = {
+        'key': key,
+        'tree': cKDTree(coords),
+        'heights': source_gdf[height_attr].to_numpy(dtype=float)[line_index],
+        'crs': source_gdf.crs,
+    }
+
+    if cache_path:
+        with open(cache_path, 'wb') as f:
+            pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+        print(f"Height index saved to {cache_path}")
+
+    return index
+
+
+def assign_heights_indexed(index, target_geojson, output_geojson, height_attr='height', max_distance=np.inf, target_crs='EPSG:2056'):
+    """
+    Assign height values from a height index (see build_height_index) to target GeoJSON based on spatial proximity.
+    Every target line gets the height of the source vertex closest to any of its vertices, all lines in one batch
+    query. Lines without a source vertex within max_distance get height 0.
+
+    Parameters:
+    index (dict): Height index of the source contour lines.
+    target_geojson (str): Path to the GeoJSON file without height values.
+    output_geojson (str): Path to save the updated GeoJSON file.
+    height_attr (str): The attribute name for the height information.
+    max_distance (float): Maximum distance between a target line and its source vertex (in CRS units).
+    target_crs (str): CRS of the output file.
+
+    Returns:
+    None
+    """
+    target_gdf = gpd.read_file(target_geojson)
+
+    # Ensure both use the same CRS
+    if index['crs'] is not None and target_gdf.crs != index['crs']:
+        target_gdf = target_gdf.to_crs(index['crs'])
+
+    coords, line_index = shapely.get_coordinates(target_gdf.geometry.values, return_index=True)
+    distance, nearest = index['tree'].query(coords, distance_upper_bound=max_distance)
+
+    # closest vertex per target line: sort by line, then distance, and take the first entry of every line
+    order = np.lexsort((distance, line_index))
+    first = order[np.r_[True, line_index[order][1:] != line_index[order][:-1]]] if len(order) else order
+    found = np.isfinite(distance[first])
+
+    heights = np.zeros(len(target_gdf))
+    heights[line_index[first][found]] = index['heights'][nearest[first][found]]
+    target_gdf[height_attr] = heights
+
+    # Explicitly set the CRS for the target GeoDataFrame before saving
+    target_gdf = target_gdf.set_crs(target_crs, allow_override=True)
+
+    # Save the updated GeoDataFrame to a new GeoJSON file
+    target_gdf.to_file(output_geojson, driver='GeoJSON')
+
+    print(f"Height values assigned and saved to {output_geojson}")
+
+
+def build_height_raster(source_geojson, resolution, height_attr='height', margin=0, cache_path=None):
+    """
+    Rasterizes the source contour lines and computes for every cell the height and distance of the nearest contour
+    line (Euclidean distance transform with indices), for assign_heights_raster.
+
+    Parameters:
+    source_geojson (str): Path to the GeoJSON file with height values.
+    resolution (float): Cell size of the grid (in CRS units).
+    height_attr (str): The attribute name in the source GeoJSON containing height information.
+    margin (float): Extend the grid beyond the bounds of the source lines by this distance (in CRS units).
+    cache_path (str, optional): Path of an .npz file to store the maps in and reuse them from, as long as the source
+        file and the parameters are unchanged.
+
+    Returns:
+    dict: 'heights' (float32 height of the nearest line per cell), 'distance' (float32 distance to it in CRS units),
+        'transform' (Affine of the grid) and 'crs'.
+    """
+    stat = os.stat(source_geojson)
+    key = np.array([os.path.abspath(source_geojson), stat.st_mtime, stat.st_size, height_attr, resolution, margin], str)
+
+    source_gdf = None
+    if cache_path and os.path.exists(cache_path):
+        cache = np.load(cache_path, allow_pickle=False)
+        if np.array_equal(cache['key'], key):
+            print(f"Height raster loaded from {cache_path}")
+            return {'heights': cache['heights'], 'distance': cache['distance'],
+                    'transform': Affine(*cache['transform']), 'crs': CRS.from_wkt(str(cache['crs'])) if cache['crs'] else None}
+
+    source_gdf = gpd.read_file(source_geojson)
+    xmin, ymin, xmax, ymax = source_gdf.total_bounds
+    xmin, ymin, xmax, ymax = xmin - margin, ymin - margin, xmax + margin, ymax + margin
+    width = int(np.ceil((xmax - xmin) / resolution)) + 1
+    height = int(np.ceil((ymax - ymin) / resolution)) + 1
+    transform = from_origin(xmin, ymax, resolution, resolution)
+
+    # line ids 1..n, 0 where there is no line
+    ids = features.rasterize(((geometry, i + 1) for i, geometry in enumerate(source_gdf.geometry) if geometry is not None),
+                             out_shape=(height, width), transform=transform, fill=0, all_touched=True, dtype='int32')
+
+    indices = np.zeros((2, height, width), np.int32)
+    distance = distance_transform_edt(ids == 0, return_indices=True, indices=indices).astype(np.float32)
+    distance *= resolution
+
+    line_heights = np.r_[np.nan, source_gdf[height_attr].to_numpy(dtype=float)].astype(np.float32)
+    heights = line_heights[ids[indices[0], indices[1]]]
+    del indices, ids
+
+    crs = source_gdf.crs
+    if cache_path:
+        np.savez(cache_path, key=key, heights=heights, distance=distance, transform=np.array(transform)[:6],
+                 crs=crs.to_wkt() if crs is not None else '')
+        print(f"Height raster saved to {cache_path}")
+
+    return {'heights': heights, 'distance': distance, 'transform': transform, 'crs': crs}
+
+
+def assign_heights_raster(height_raster, target_geojson, output_geojson, height_attr='height', max_distance=np.inf, target_crs='EPSG:2056'):
+    """
+    Assign height values from a height raster (see build_height_raster) to target GeoJSON: the raster is sampled at
+    all vertices of the target lines and every line gets the height most of its vertices agree on. Vertices farther
+    than max_distance from a source line or outside the raster do not vote; lines without votes get height 0.
+
+    Parameters:
+    height_raster (dict): Height raster of the source contour lines.
+    target_geojson (str): Path to the GeoJSON file without height values.
+    output_geojson (str): Path to save the updated GeoJSON file.
+    height_attr (str): The attribute name for the height information.
+    max_distance (float): Maximum distance between a vertex and the nearest source line (in CRS units).
+    target_crs (str): CRS of the output file.
+
+    Returns:
+    None
+    """
+    target_gdf = gpd.read_file(target_geojson)
+
+    # Ensure both use the same CRS
+    if height_raster['crs'] is not None and target_gdf.crs != height_raster['crs']:
+        target_gdf = target_gdf.to_crs(height_raster['crs'])
+
+    coords, line_index = shapely.get_coordinates(target_gdf.geometry.values, return_index=True)
+    cols, rows = ~height_raster['transform'] * (coords[:, 0], coords[:, 1])
+    rows, cols = np.floor(rows).astype(np.int64), np.floor(cols).astype(np.int64)
+
+    heights_map, distance_map = height_raster['heights'], height_raster['distance']
+    inside = (rows >= 0) & (rows < heights_map.shape[0]) & (cols >= 0) & (cols < heights_map.shape[1])
+    line_index, rows, cols = line_index[inside], rows[inside], cols[inside]
+    valid = distance_map[rows, cols] <= max_distance
+    line_index, vertex_heights = line_index[valid], heights_map[rows[valid], cols[valid]]
+
+    # majority vote: count the (line, height) pairs and keep the most frequent height of every line
+    pairs, counts = np.unique(np.stack([line_index.astype(np.float64), vertex_heights], axis=1), axis=0, return_counts=True)
+    order = np.lexsort((-counts, pairs[:, 0]))
+    first = order[np.r_[True, pairs[order, 0][1:] != pairs[order, 0][:-1]]] if len(order) else order
+
+    heights = np.zeros(len(target_gdf))
+    heights[pairs[first, 0].astype(np.int64)] = pairs[first, 1]
+    target_gdf[height_attr] = heights
+
+    # Explicitly set the CRS for the target GeoDataFrame before saving
+    target_gdf = target_gdf.set_crs(target_crs, allow_override=True)
+
+    # Save the updated GeoDataFrame to a new GeoJSON file
+    target_gdf.to_file(output_geojson, driver='GeoJSON')
+
+    print(f"Height values assigned and saved to {output_geojson}")
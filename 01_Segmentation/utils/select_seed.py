@@ -1,42 +1,186 @@
 import matplotlib.pyplot as plt
-from skimage import color
 import numpy as np
 import time
 import sys
+import os
+import json
+import cv2
+import rasterio
+from rasterio.windows import Window
 
-def select_seed(image):
+def _gray(image):
+    # uint8 grayscale of a (row, col[, channel]) image
+    if image.ndim == 3:
+        return cv2.cvtColor(np.ascontiguousarray(image[..., :3]), cv2.COLOR_RGB2GRAY)
+    return np.asarray(image)
+
+
+def image_shape(source):
+    """
+    Returns the size of an image array or image file without reading the pixels.
+
+    Parameters:
+    source (ndarray or str): Image array or path to an image file readable by rasterio.
+
+    Returns:
+    tuple: (height, width) in pixels.
+    """
+    if isinstance(source, np.ndarray):
+        return source.shape[:2]
+    with rasterio.open(source) as src:
+        return src.height, src.width
+
+
+def read_level_window(source, row, col, height, width, factor):
+    """
+    Reads a window of an image, downsampled by an integer factor (one level of the overview pyramid).
+    For files, rasterio reads only the window at the reduced resolution (using the overviews of the file if present).
+
+    Parameters:
+    source (ndarray or str): Image array or path to an image file readable by rasterio.
+    row, col (int): Top left corner of the window in full resolution pixels.
+    height, width (int): Size of the window in full resolution pixels.
+    factor (int): Downsampling factor.
+
+    Returns:
+    ndarray: uint8 grayscale image of shape (ceil(height / factor), ceil(width / factor)).
+    """
+    out_height, out_width = -(-height // factor), -(-width // factor)
+
+    if isinstance(source, np.ndarray):
+        window = source[row:row + height:factor, col:col + width:factor]
+        return _gray(window)
+
+    with rasterio.open(source) as src:
+        indexes = [1, 2, 3] if src.count >= 3 else [1]
+        data = src.read(indexes, window=Window(col, row, width, height), out_shape=(len(indexes), out_height, out_width))
+    data = np.moveaxis(data, 0, -1)
+    if data.dtype != np.uint8:
+        data = cv2.normalize(data, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+    return _gray(data if len(indexes) == 3 else data[..., 0])
+
+
+def build_overview_pyramid(source, max_size=2048, cache_path=None):
+    """
+    Builds (or loads from cache) the coarsest level of a power-of-two overview pyramid of an image: the largest
+    downsampling 2^k such that the overview fits into max_size x max_size pixels.
+    Finer levels are read on demand with read_level_window.
+
+    Parameters:
+    source (ndarray or str): Image array or path to an image file readable by rasterio.
+    max_size (int): Maximum width and height of the overview in pixels.
+    cache_path (str, optional): Path of an .npz file to store the overview in and reuse it from.
+        The cache is rebuilt if the source file changed.
+
+    Returns:
+    tuple: (overview, factor) with overview a uint8 grayscale image and factor its downsampling factor.
+    """
+    height, width = image_shape(source)
+    factor = 1
+    while max(height, width) > max_size * factor:
+        factor *= 2
+
+    stamp = os.path.getmtime(source) if isinstance(source, str) else -1.0
+
+    if cache_path and os.path.exists(cache_path):
+        cache = np.load(cache_path)
+        if int(cache['factor']) == factor and float(cache['stamp']) == stamp and \
+                tuple(cache['shape']) == (height, width):
+            return cache['overview'], factor
+
+    if isinstance(source, np.ndarray) and factor > 1:
+        # halve the image step by step, only the first step touches the full resolution
+        overview = _gray(source)
+        level = 1
+        while level < factor:
+            overview = cv2.pyrDown(overview)
+            level *= 2
+    else:
+        overview = read_level_window(source, 0, 0, height, width, factor)
+
+    if cache_path:
+        np.savez(cache_path, overview=overview, factor=factor, stamp=stamp, shape=(height, width))
+
+    return overview, factor
+
+
+def select_seed(image, max_size=2048, cache_path=None):
     """
     Function to display the image and allow the user to click on a point to set a seed pixel.
+    Large images are shown as a downsampled overview (see build_overview_pyramid); when zooming in, the visible part
+    is reloaded at a finer level, up to full resolution.
     
     Parameters:
-    image (ndarray): Input image (can be grayscale or RGB).
+    image (ndarray or str): Input image (can be grayscale or RGB) or path to an image file readable by rasterio.
+    max_size (int): Maximum width and height of the overview in pixels.
+    cache_path (str, optional): Path of an .npz file to cache the overview in.
     
     Returns:
-    seed_point (tuple): Coordinates of the selected seed pixel (row, col).
+    seed_point (tuple): Coordinates of the selected seed pixel (row, col) in full resolution.
     """
     print("--- select_seed ---")
     
-    # Convert to grayscale if it's an RGB image
-    if len(image.shape) == 3:
-        grayscale = color.rgb2gray(image)
-    else:
-        grayscale = image
+    height, width = image_shape(image)
+    overview, overview_factor = build_overview_pyramid(image, max_size, cache_path)
 
-    # Set up the plot
+    # Set up the plot, in full resolution pixel coordinates
     fig, ax = plt.subplots()
-    ax.imshow(grayscale, cmap='gray')
+    ax.imshow(overview, cmap='gray', extent=(-0.5, overview.shape[1] * overview_factor - 0.5,
+                                             overview.shape[0] * overview_factor - 0.5, -0.5))
+    ax.set_xlim(-0.5, width - 0.5)
+    ax.set_ylim(height - 0.5, -0.5)
+    ax.set_autoscale_on(False)
     ax.set_title('Click to set the seed pixel, then close the window')
 
+    # Finer level of the visible part, shown on top of the overview
+    detail = {'artist': None, 'key': None}
+
+    def refresh_detail(ax):
+        x0, x1 = sorted(ax.get_xlim())
+        y0, y1 = sorted(ax.get_ylim())
+        col, row = max(int(x0), 0), max(int(y0), 0)
+        cols, rows = min(int(np.ceil(x1)) + 1, width) - col, min(int(np.ceil(y1)) + 1, height) - row
+        if cols <= 0 or rows <= 0:
+            return
+
+        # coarsest level that still shows at least one image pixel per screen pixel
+        bbox = ax.get_window_extent()
+        factor = 1
+        while factor * 2 <= max(cols / bbox.width, rows / bbox.height, 1):
+            factor *= 2
+
+        key = (row, col, rows, cols, factor)
+        if key == detail['key']:
+            return
+        detail['key'] = key
+
+        if detail['artist'] is not None:
+            detail['artist'].remove()
+            detail['artist'] = None
+        if factor < overview_factor:
+            window = read_level_window(image, row, col, rows, cols, factor)
+            detail['artist'] = ax.imshow(window, cmap='gray', zorder=1,
+                                         extent=(col - 0.5, col + window.shape[1] * factor - 0.5,
+                                                 row + window.shape[0] * factor - 0.5, row - 0.5))
+        fig.canvas.draw_idle()
+
+    if overview_factor > 1:
+        ax.callbacks.connect('xlim_changed', refresh_detail)
+        ax.callbacks.connect('ylim_changed', refresh_detail)
+
     # To store the clicked seed point
     seed_point = []
 
     # Event handler to capture the click event
     def onclick(event):
-        # Ensure that the click is within the image bounds
-        if event.xdata is not None and event.ydata is not None:
-            x, y = int(event.xdata), int(event.ydata)
+        # Ignore clicks outside the image and clicks of the zoom and pan tools
+        toolbar = fig.canvas.toolbar
+        if event.inaxes is not ax or event.xdata is None or event.ydata is None or (toolbar is not None and toolbar.mode):
+            return
+        x, y = int(event.xdata + 0.5), int(event.ydata + 0.5)
+        if 0 <= x < width and 0 <= y < height:
             seed_point.append((y, x))  # Append row, col format
-            ax.plot(x, y, 'ro')  # Mark the seed point on the image
+            ax.plot(x, y, 'ro', zorder=2)  # Mark the seed point on the image
             plt.draw()  # Update the plot immediately
             print(f'Seed point selected: (row={y}, col={x})')
 
@@ -62,31 +206,74 @@ def select_seed(image):
     else:
         return None
 
-def check_seed_point(seed_point,image):
-    def check_seed_point(seed_point, image):
-        """
-        Checks if the provided seed point is acceptable and allows the user to select a new one if necessary.
-        Parameters:
-        seed_point (tuple): The initial seed point to be checked.
-        image (ndarray): The image on which the seed point is to be selected.
-        Returns:
-        bool: True if a valid seed point is selected, False otherwise.
-        The function prompts the user to confirm if the provided seed point is acceptable. If the user responds with 'no',
-        it allows the user to select a new seed point until an acceptable one is chosen.
-        """
-    
-    
-    
+def confirm_seed_point(seed_point, image, cache_path=None):
+    """
+    Asks the user to confirm a seed point and lets them select a new one until an acceptable one is chosen.
+
+    Parameters:
+    seed_point (tuple): The initial seed point to be checked (row, col).
+    image (ndarray or str): The image (or path to it) on which a new seed point is selected.
+    cache_path (str, optional): Path of the overview cache of the image (see select_seed).
+
+    Returns:
+    tuple: The confirmed seed point (row, col), or None if no seed point was selected.
+    """
     if seed_point:
         response = input("Is this seed point okay? (yes/no): ").lower().strip()
         while response == 'no':
             print("Select a new point on the map...")
-            seed_point = select_seed(image)
+            seed_point = select_seed(image, cache_path=cache_path)
             response = input("Is this seed point okay? (yes/no): ").lower().strip()
-        print(f"Selected seed point: {seed_point}")   
-        return True     
+    if seed_point:
+        print(f"Selected seed point: {seed_point}")
+        return seed_point
     else:
         print("No seed point was selected.")
-        return False
-        
-        
\ No newline at end of file
+        return None
+
+
+def check_seed_point(seed_point, image):
+    """
+    Checks if the provided seed point is acceptable and allows the user to select a new one if necessary.
+
+    Parameters:
+    seed_point (tuple): The initial seed point to be checked.
+    image (ndarray): The image on which the seed point is to be selected.
+
+    Returns:
+    bool: True if a valid seed point is selected, False otherwise.
+    """
+    return confirm_seed_point(seed_point, image) is not None
+
+
+def load_seed_point(seed_path):
+    """
+    Loads a seed point stored with save_seed_point.
+
+    Parameters:
+    seed_path (str): Path of the seed point file (JSON).
+
+    Returns:
+    tuple: The seed point (row, col), or None if the file does not exist.
+    """
+    if not os.path.exists(seed_path):
+        return None
+    with open(seed_path) as f:
+        seed = json.load(f)
+    return (int(seed['row']), int(seed['col']))
+
+
+def save_seed_point(seed_path, seed_point):
+    """
+    Stores a seed point next to the segmentation output, so that reruns can skip the seed selection.
+
+    Parameters:
+    seed_path (str): Path of the seed point file (JSON).
+    seed_point (tuple): The seed point (row, col).
+
+    Returns:
+    None
+    """
+    with open(seed_path, 'w') as f:
+        json.dump({'row': int(seed_point[0]), 'col': int(seed_point[1])}, f)
+    print(f"Seed point saved to {seed_path}")
@@ -0,0 +1,245 @@
+import numpy as np
+import cv2
+
+
+# Neighbour offsets (row, col) in clockwise order, starting north.
+# Bit k of a neighbourhood code is set if neighbour k is a skeleton pixel.
+NEIGHBOURS = ((-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1))
+
+# Pixel classes by number of skeleton neighbours
+ISOLATED, ENDPOINT, PATH, JUNCTION = 0, 1, 2, 3
+
+_BITS = np.array([[(code >> k) & 1 for k in range(8)] for code in range(256)], np.uint8)
+_COUNT = _BITS.sum(axis=1).astype(np.uint8)
+# first and last neighbour direction of each code (for path pixels: their two neighbours)
+_FIRST = np.array([np.flatnonzero(bits)[0] if bits.any() else 0 for bits in _BITS], np.int8)
+_LAST = np.array([np.flatnonzero(bits)[-1] if bits.any() else 0 for bits in _BITS], np.int8)
+
+
+def _staircase_table(orientation):
+    # Deletable corner pixels of one orientation: both 4-neighbours around the diagonal 2*orientation+1 are set,
+    # the diagonal itself is not, and removing the pixel keeps its neighbours 8-connected (Yokoi number 1).
+    table = np.zeros(256, np.uint8)
+    for code, bits in enumerate(_BITS):
+        inv = 1 - bits.astype(int)
+        yokoi = sum(inv[k] - inv[k] * inv[(k + 1) % 8] * inv[(k + 2) % 8] for k in (0, 2, 4, 6))
+        a, d, b = bits[2 * orientation], bits[2 * orientation + 1], bits[(2 * orientation + 2) % 8]
+        table[code] = a and b and not d and yokoi == 1
+    return table
+
+
+_STAIRCASE = [_staircase_table(o) for o in range(4)]
+
+
+def neighbourhood_codes(skeleton):
+    """
+    Computes the 8-neighbourhood code of every pixel of a skeleton.
+
+    Parameters:
+    skeleton (ndarray): Binary skeleton image.
+
+    Returns:
+    ndarray: uint8 code per pixel, bit k set if the neighbour NEIGHBOURS[k] is a skeleton pixel.
+    """
+    sk = np.pad((np.asarray(skeleton) > 0).astype(np.uint8), 1)
+    h, w = sk.shape
+    codes = np.zeros((h - 2, w - 2), np.uint8)
+    for k, (di, dj) in enumerate(NEIGHBOURS):
+        codes |= sk[1 + di:h - 1 + di, 1 + dj:w - 1 + dj] << k
+    return codes
+
+
+def remove_staircases(skeleton):
+    """
+    Removes redundant corner pixels ("staircases") from a skeleton, so that every pixel inside a line has exactly
+    two neighbours. Thinning leaves such corners where a line changes direction; without this they would count as
+    junctions. Connectivity is preserved.
+
+    Parameters:
+    skeleton (ndarray): Binary skeleton image (one pixel wide).
+
+    Returns:
+    ndarray: Cleaned boolean skeleton.
+    """
+    skeleton = np.asarray(skeleton) > 0
+    changed = True
+    while changed:
+        changed = False
+        for table in _STAIRCASE:
+            delete = skeleton & (table[neighbourhood_codes(skeleton)] > 0)
+            if delete.any():
+                skeleton = skeleton & ~delete
+                changed = True
+    return skeleton
+
+
+def classify_skeleton_pixels(skeleton):
+    """
+    Classifies skeleton pixels by their number of skeleton neighbours.
+
+    Parameters:
+    skeleton (ndarray): Binary skeleton image (one pixel wide).
+
+    Returns:
+    ndarray: int8 class per pixel: -1 background, ISOLATED, ENDPOINT, PATH or JUNCTION (3 or more neighbours).
+    """
+    count = _COUNT[neighbourhood_codes(skeleton)]
+    classes = np.minimum(count, JUNCTION).astype(np.int8)
+    classes[np.asarray(skeleton) == 0] = -1
+    return classes
+
+
+def prune_skeleton(skeleton, spur_length=10, min_component_length=0):
+    """
+    Removes short spurs and small components from a skeleton.
+
+    Endpoints are peeled off spur_length times, which removes every branch of at most spur_length pixels that ends
+    in an endpoint. The remaining lines lost spur_length pixels at their free ends; these are grown back from the
+    new endpoints along the original skeleton, and pixels the peeling left without any neighbour are removed.
+    Only branches of parts with a junction are spurs: lines and closed rings without a junction are kept whole,
+    whatever their length (use min_component_length to remove short ones).
+
+    Parameters:
+    skeleton (ndarray): Binary skeleton image (one pixel wide).
+    spur_length (int): Maximum length of the removed spurs in pixels, 0 to keep all spurs.
+    min_component_length (int): Connected skeleton parts with fewer pixels are removed.
+
+    Returns:
+    ndarray: Pruned boolean skeleton (without staircases, see remove_staircases).
+    """
+    original = remove_staircases(skeleton)
+    pruned = original.copy()
+
+    for _ in range(spur_length):
+        endpoints = pruned & (_COUNT[neighbourhood_codes(pruned)] == 1)
+        if not endpoints.any():
+            break
+        pruned &= ~endpoints
+
+    if spur_length:
+        # grow the cut line ends back along the original skeleton
+        grown = (pruned & (_COUNT[neighbourhood_codes(pruned)] == 1)).astype(np.uint8)
+        kernel = np.ones((3, 3), np.uint8)
+        allowed = (original & ~pruned).astype(np.uint8)  # do not grow through the kept skeleton into cut spurs
+        for _ in range(spur_length):
+            grown = cv2.dilate(grown, kernel) & allowed
+        pruned |= grown > 0
+        pruned &= _COUNT[neighbourhood_codes(pruned)] > 0
+
+        # parts without a junction have no spurs, restore them
+        _, labels = cv2.connectedComponents(original.astype(np.uint8), connectivity=8)
+        branched = np.zeros(labels.max() + 1, bool)
+        branched[labels[original & (_COUNT[neighbourhood_codes(original)] >= 3)]] = True
+        pruned |= original & ~branched[labels]
+
+    if min_component_length > 1:
+        num_labels, labels, stats, _ = cv2.connectedComponentsWithStats(pruned.astype(np.uint8), connectivity=8)
+        keep = stats[:, cv2.CC_STAT_AREA] >= min_component_length
+        keep[0] = False  # background
+        pruned = keep[labels]
+
+    return pruned
+
+
+def trace_skeleton_graph(skeleton, min_length=2):
+    """
+    Vectorizes a one pixel wide skeleton by walking its pixel graph once.
+
+    Redundant corner pixels are removed first (see remove_staircases). Endpoints (1 neighbour) and junctions
+    (3 or more neighbours) are then the nodes of the graph; every chain of path
+    pixels (2 neighbours) between two nodes becomes one polyline, ending exactly on the node pixels, so polylines
+    meeting at a junction share its coordinates. Closed chains without any node (e.g. a contour ring) become closed
+    polylines. Adjacent junction pixels form one junction (e.g. the five pixels of a "+" crossing); its node is the
+    junction pixel nearest to their centroid and every polyline of the junction ends on it. Runtime is linear in the
+    number of skeleton pixels.
+
+    Parameters:
+    skeleton (ndarray): Binary skeleton image (one pixel wide), e.g. the output of thinning().
+    min_length (int): Minimum number of vertices of a polyline.
+
+    Returns:
+    list: Polylines as lists of [x, y] pixel coordinates (x = column, y = row), like traceSkeleton.
+    """
+    skeleton = remove_staircases(skeleton)
+    h, w = skeleton.shape
+
+    # work on a padded, flattened copy so that neighbours never leave the array
+    codes = np.pad(neighbourhood_codes(skeleton), 1)
+    fg = np.pad(skeleton, 1).ravel()
+    codes = codes.ravel()
+    codes[~fg] = 0
+    count = _COUNT[codes]
+    first = _FIRST[codes]
+    last = _LAST[codes]
+    W = w + 2
+    offsets = [di * W + dj for di, dj in NEIGHBOURS]
+
+    # adjacent junction pixels belong to the same junction
+    junctions = (count >= 3) & fg
+    _, cluster = cv2.connectedComponents(junctions.reshape(h + 2, w + 2).astype(np.uint8), connectivity=8)
+    cluster = cluster.ravel()
+    # the node of each junction is its pixel nearest to the centroid (the first one in row-major order on ties)
+    pixels = np.flatnonzero(cluster)
+    labels = cluster[pixels]
+    size = np.bincount(labels)
+    rows, cols = pixels // W, pixels % W
+    dist = (rows - np.bincount(labels, rows)[labels] / size[labels]) ** 2 + \
+           (cols - np.bincount(labels, cols)[labels] / size[labels]) ** 2
+    order = np.lexsort((pixels, dist, labels))
+    labels, pixels = labels[order], pixels[order]
+    node = np.zeros(len(size), np.int64)
+    leading = np.diff(labels, prepend=0) != 0
+    node[labels[leading]] = pixels[leading]
+
+    visited = np.zeros(fg.shape, bool)
+    chains = []
+
+    def walk(start, prev, cur):
+        # follow path pixels from cur (coming from prev) until a node is reached
+        chain = [start, cur]
+        while count[cur] == 2 and not visited[cur]:
+            visited[cur] = True
+            nxt = cur + offsets[first[cur]]
+            if nxt == prev:
+                nxt = cur + offsets[last[cur]]
+            prev, cur = cur, nxt
+            chain.append(cur)
+        return chain
+
+    nodes = np.flatnonzero(fg & (count != 2) & (count > 0))
+    for n in nodes:
+        code = int(codes[n])
+        for k in range(8):
+            if not (code >> k) & 1:
+                continue
+            q = n + offsets[k]
+            if count[q] == 2:
+                if visited[q]:
+                    continue
+                chain = walk(n, n, q)
+                # a path pixel bridging two pixels of the same junction
+                if len(chain) <= 3 and cluster[n] and cluster[chain[-1]] == cluster[n]:
+                    continue
+                chains.append(chain)
+            elif q > n and not (cluster[n] and cluster[q] == cluster[n]):
+                chains.append([n, q])  # two adjacent nodes
+
+    # the remaining path pixels form closed rings
+    for s in np.flatnonzero(fg & (count == 2) & ~visited):
+        if visited[s]:
+            continue
+        visited[s] = True
+        chains.append(walk(s, s, s + offsets[first[s]]))  # ends on s again
+
+    polylines = []
+    for chain in chains:
+        # end the chains of a junction on its node
+        if cluster[chain[0]] and chain[0] != node[cluster[chain[0]]]:
+            chain.insert(0, node[cluster[chain[0]]])
+        if cluster[chain[-1]] and chain[-1] != node[cluster[chain[-1]]]:
+            chain.append(node[cluster[chain[-1]]])
+        if len(chain) < min_length:
+            continue
+        chain = np.array(chain)
+        polylines.append(np.stack([chain % W - 1, chain // W - 1], axis=1).tolist())
+    return polylines
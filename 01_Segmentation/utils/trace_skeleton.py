@@ -4,49 +4,105 @@
 # Lingdong Huang 2020
 
 import numpy as np
+from collections import deque
+import heapq
+import time
+import multiprocessing
+from multiprocessing import shared_memory
 
-# binary image thinning (skeletonization) in-place.
+# neighbour offsets (row, col) of p2..p9, clockwise starting north;
+# bit k of a neighbourhood code holds p(k+2)
+NEIGHBOURS = ((-1,0),(-1,1),(0,1),(1,1),(1,0),(1,-1),(0,-1),(-1,-1));
+
+# deletion decision of one Zhang-Suen sub-iteration for each of the
+# 256 possible 8-neighbourhood codes
+# @param iter  sub-iteration, 0 or 1
+# @return      256-entry uint8 lookup table, 1 = delete centre pixel
+def zsTable(iter):
+  table = np.zeros(256,np.uint8);
+  for code in range(256):
+    p2,p3,p4,p5,p6,p7,p8,p9 = [(code >> k) & 1 for k in range(8)];
+    A  = (p2 == 0 and p3) + (p3 == 0 and p4) + \
+         (p4 == 0 and p5) + (p5 == 0 and p6) + \
+         (p6 == 0 and p7) + (p7 == 0 and p8) + \
+         (p8 == 0 and p9) + (p9 == 0 and p2);
+    B  = p2 + p3 + p4 + p5 + p6 + p7 + p8 + p9;
+    m1 = (p2 * p4 * p6) if (iter == 0 ) else (p2 * p4 * p8);
+    m2 = (p4 * p6 * p8) if (iter == 0 ) else (p2 * p6 * p8);
+    if (A == 1 and (B >= 2 and B <= 6) and m1 == 0 and m2 == 0):
+      table[code] = 1;
+  return table
+
+ZS_TABLES = (zsTable(0), zsTable(1));
+
+# 8-neighbourhood codes of the given pixels
+# @param flat  the binary image, flattened (0/1 uint8)
+# @param idx   flat indices of pixels, none of them on the image border
+# @param w     image width
+# @return      uint8 code per pixel, see NEIGHBOURS
+def neighbourCodes(flat, idx, w):
+  code = np.zeros(idx.shape,np.uint8);
+  for k,(di,dj) in enumerate(NEIGHBOURS):
+    code |= flat[idx+(di*w+dj)] << k;
+  return code
+
+# binary image thinning (skeletonization).
 # implements Zhang-Suen algorithm.
 # http://agcggs680.pbworks.com/f/Zhan-Suen_algorithm.pdf
-# @param im   the binary image
+# Vectorized: each sub-iteration looks up the deletion decision of all
+# candidate pixels in ZS_TABLES at once. Only boundary pixels (foreground
+# with at least one background neighbour) can ever be deleted, so the
+# candidate set starts as the boundary and afterwards only grows by the
+# neighbours of deleted pixels.
+# @param im   the binary image (0/1)
+# @return     thinned copy of the image (0/1 uint8)
 def thinningZS(im):
-  prev = np.zeros(im.shape,np.uint8);
+  im = (np.asarray(im) != 0).astype(np.uint8);
+  h, w = im.shape;
+  if (h < 3 or w < 3):
+    return im
+  flat = im.ravel();
+  inner = np.zeros(im.shape,bool);
+  inner[1:-1,1:-1] = True;
+  idx = np.flatnonzero(inner & (im > 0));
+  idx = idx[neighbourCodes(flat,idx,w) != 255]; # interior pixels are never deleted
+  inner = inner.ravel();
+  candidate = np.zeros(flat.shape,bool);
+  candidate[idx] = True;
+  offsets = np.array([di*w+dj for di,dj in NEIGHBOURS]);
   while True:
-    im = thinningZSIteration(im,0);
-    im = thinningZSIteration(im,1)
-    diff = np.sum(np.abs(prev-im));
-    if not diff:
+    changed = False;
+    for iter in (0,1):
+      dele = idx[ZS_TABLES[iter][neighbourCodes(flat,idx,w)] > 0];
+      if (not dele.size):
+        continue
+      changed = True;
+      flat[dele] = 0;
+      candidate[dele] = False;
+      # foreground neighbours of deleted pixels are now on the boundary
+      nb = np.sort((dele[:,None]+offsets).ravel());
+      nb = nb[np.r_[True,nb[1:] != nb[:-1]]];
+      nb = nb[(flat[nb] > 0) & inner[nb] & ~candidate[nb]];
+      candidate[nb] = True;
+      idx = np.concatenate((idx[flat[idx] > 0],nb));
+    if not changed:
       break
-    prev = im
   return im
 
-# 1 pass of Zhang-Suen thinning 
+# 1 pass of Zhang-Suen thinning
 def thinningZSIteration(im, iter):
+  im = np.asarray(im);
   marker = np.zeros(im.shape,np.uint8);
-  for i in range(1,im.shape[0]-1):
-    for j in range(1,im.shape[1]-1):
-      p2 = im[(i-1),j]  ;
-      p3 = im[(i-1),j+1];
-      p4 = im[(i),j+1]  ;
-      p5 = im[(i+1),j+1];
-      p6 = im[(i+1),j]  ;
-      p7 = im[(i+1),j-1];
-      p8 = im[(i),j-1]  ;
-      p9 = im[(i-1),j-1];
-      A  = (p2 == 0 and p3) + (p3 == 0 and p4) + \
-           (p4 == 0 and p5) + (p5 == 0 and p6) + \
-           (p6 == 0 and p7) + (p7 == 0 and p8) + \
-           (p8 == 0 and p9) + (p9 == 0 and p2);
-      B  = p2 + p3 + p4 + p5 + p6 + p7 + p8 + p9;
-      m1 = (p2 * p4 * p6) if (iter == 0 ) else (p2 * p4 * p8);
-      m2 = (p4 * p6 * p8) if (iter == 0 ) else (p2 * p6 * p8);
-
-      if (A == 1 and (B >= 2 and B <= 6) and m1 == 0 and m2 == 0):
-        marker[i,j] = 1;
-
+  if (im.shape[0] < 3 or im.shape[1] < 3):
+    return np.bitwise_and(im,np.bitwise_not(marker))
+  h, w = im.shape;
+  b = (im != 0).astype(np.uint8);
+  code = np.zeros((h-2,w-2),np.uint8);
+  for k,(di,dj) in enumerate(NEIGHBOURS):
+    code |= b[1+di:h-1+di,1+dj:w-1+dj] << k;
+  marker[1:-1,1:-1] = ZS_TABLES[iter][code] & b[1:-1,1:-1];
   return np.bitwise_and(im,np.bitwise_not(marker))
 
-
 def thinningSkimage(im):
   from skimage.morphology import skeletonize
   return skeletonize(im).astype(np.uint8)
@@ -57,54 +113,105 @@ def thinning(im):
   except:
     return thinningZS(im)
 
+# summed-area table of the image, built once per trace so that region
+# sums become O(1) lookups; sat[i,j] is the sum of im[:i,:j]
+# @param im   the bitmap image
+# @param sat  optional preallocated (h+1) x (w+1) output table
+# @return     (h+1) x (w+1) table
+def integralImage(im, sat=None):
+  if sat is None:
+    dtype = np.int32 if im.shape[0]*im.shape[1] < 2**31 else np.int64;
+    sat = np.zeros((im.shape[0]+1,im.shape[1]+1),dtype);
+  sat[0,:] = 0;
+  sat[:,0] = 0;
+  np.cumsum(im,axis=0,dtype=sat.dtype,out=sat[1:,1:]);
+  np.cumsum(sat[1:,1:],axis=1,out=sat[1:,1:]);
+  return sat
+
+# number of white pixels in a region, from the summed-area table
+def regionSum(sat, x, y, w, h):
+  return sat[y+h,x+w] - sat[y,x+w] - sat[y+h,x] + sat[y,x]
+
 #check if a region has any white pixel
-def notEmpty(im, x, y, w, h):
-  return np.sum(im) > 0
+def notEmpty(im, x, y, w, h, sat=None):
+  if sat is None:
+    return np.sum(im[y:y+h,x:x+w]) > 0
+  return regionSum(sat,x,y,w,h) > 0
 
 
-# merge ith fragment of second chunk to first chunk
-# @param c0   fragments from first  chunk
-# @param c1   fragments from second chunk
-# @param i    index of the fragment in first chunk
+# index of the fragment ends of the first chunk that lie on (or next to) the
+# seam: for the left and the right end, a dict from the coordinate along the
+# seam to the set of fragment indices, so that matches are found in O(1)
+# @param c0   fragments from first chunk
 # @param sx   (x or y) coordinate of the seam
 # @param isv  is vertical, not horizontal?
-# @param mode 2-bit flag, 
-#             MSB = is matching the left (not right) end of the fragment from first  chunk
-#             LSB = is matching the right (not left) end of the fragment from second chunk
-# @return     matching successful?             
+# @return     (left end index, right end index)
+#
+def seamIndex(c0, sx, isv):
+  index = ({},{});
+  for j in range(len(c0)):
+    seamIndexAdd(index,c0[j][0],j,0,sx,isv);
+    seamIndexAdd(index,c0[j][-1],j,1,sx,isv);
+  return index
+
+def seamIndexAdd(index, p, j, end, sx, isv):
+  if (abs(p[isv]-sx)<=1): # on the seam
+    index[end].setdefault(p[not isv],set()).add(j);
+
+def seamIndexRemove(index, p, j, end, sx, isv):
+  if (abs(p[isv]-sx)<=1):
+    index[end][p[not isv]].discard(j);
+
+
+# merge ith fragment of second chunk to first chunk
+# @param c0    fragments from first  chunk
+# @param c1    fragments from second chunk
+# @param i     index of the fragment in first chunk
+# @param sx    (x or y) coordinate of the seam
+# @param isv   is vertical, not horizontal?
+# @param mode  2-bit flag, 
+#              MSB = is matching the left (not right) end of the fragment from first  chunk
+#              LSB = is matching the right (not left) end of the fragment from second chunk
+# @param index seam index of c0 (see seamIndex), kept up to date; built if not given
+# @return      matching successful?             
 # 
-def mergeImpl(c0, c1, i, sx, isv, mode):
+def mergeImpl(c0, c1, i, sx, isv, mode, index=None):
 
   B0 = (mode >> 1 & 1)>0; # match c0 left
   B1 = (mode >> 0 & 1)>0; # match c1 left
   mj = -1;
   md = 4; # maximum offset to be regarded as continuous
   
+  if index is None:
+    index = seamIndex(c0,sx,isv);
+  
   p1 = c1[i][0 if B1 else -1];
   
   if (abs(p1[isv]-sx)>0): # not on the seam, skip
     return False
   
-  # find the best match
-  for j in range(len(c0)):
-    p0 = c0[j][0 if B0 else -1];
-    if (abs(p0[isv]-sx)>1): # not on the seam, skip
-      continue
-    
-    d = abs(p0[not isv] - p1[not isv]);
-    if (d < md):
-      mj = j;
-      md = d;
+  # find the best match: the nearest end on the seam, ties go to the first fragment
+  e0 = 0 if B0 else 1;
+  for d in range(md):
+    candidates = index[e0].get(p1[not isv]-d,set()) | index[e0].get(p1[not isv]+d,set());
+    if (candidates):
+      mj = min(candidates);
+      break
 
   if (mj != -1): # best match is good enough, merge them
+    if (not isinstance(c0[mj],deque)): # joins extend the fragment in place
+      c0[mj] = deque(c0[mj]);
+    f0 = c0[mj];
+    seamIndexRemove(index,f0[0 if B0 else -1],mj,e0,sx,isv);
     if (B0 and B1):
-      c0[mj] = list(reversed(c1[i])) + c0[mj]
+      f0.extendleft(c1[i]); # reversed(c1[i]) + c0[mj]
     elif (not B0 and B1):
-      c0[mj]+=c1[i]
+      f0.extend(c1[i]);
     elif (B0 and not B1):
-      c0[mj] = c1[i] + c0[mj]
+      f0.extendleft(reversed(c1[i])); # c1[i] + c0[mj]
     else:
-      c0[mj] += list(reversed(c1[i]))
+      f0.extend(reversed(c1[i]));
+    seamIndexAdd(index,f0[0 if B0 else -1],mj,e0,sx,isv);
     
     c1.pop(i);
     return True;
@@ -114,23 +221,20 @@ HORIZONTAL = 1;
 VERTICAL = 2;
 
 # merge fragments from two chunks
+# fragments that get joined become deques, so joins never copy the first chunk's polyline
 # @param c0   fragments from first  chunk
 # @param c1   fragments from second chunk
 # @param sx   (x or y) coordinate of the seam
 # @param dr   merge direction, HORIZONTAL or VERTICAL?
 # 
 def mergeFrags(c0, c1, sx, dr):
+  isv = (dr != HORIZONTAL);
+  index = seamIndex(c0,sx,isv);
   for i in range(len(c1)-1,-1,-1):
-    if (dr == HORIZONTAL):
-      if (mergeImpl(c0,c1,i,sx,False,1)):continue;
-      if (mergeImpl(c0,c1,i,sx,False,3)):continue;
-      if (mergeImpl(c0,c1,i,sx,False,0)):continue;
-      if (mergeImpl(c0,c1,i,sx,False,2)):continue;
-    else:
-      if (mergeImpl(c0,c1,i,sx,True,1)):continue;
-      if (mergeImpl(c0,c1,i,sx,True,3)):continue;
-      if (mergeImpl(c0,c1,i,sx,True,0)):continue;
-      if (mergeImpl(c0,c1,i,sx,True,2)):continue;      
+    if (mergeImpl(c0,c1,i,sx,isv,1,index)):continue;
+    if (mergeImpl(c0,c1,i,sx,isv,3,index)):continue;
+    if (mergeImpl(c0,c1,i,sx,isv,0,index)):continue;
+    if (mergeImpl(c0,c1,i,sx,isv,2,index)):continue;
     
   c0 += c1
 
@@ -145,9 +249,11 @@ def mergeFrags(c0, c1, sx, dr):
 # @param y    top of    chunk
 # @param w    width of  chunk
 # @param h    height of chunk
+# @param guessCenter  apply the crossroad heuristic (a scan over the whole chunk);
+#                     if false, crossroads meet at the center of the chunk
 # @return     the polyline fragments
 # 
-def chunkToFrags(im, x, y, w, h):
+def chunkToFrags(im, x, y, w, h, guessCenter=True):
   frags = []
   on = False; # to deal with strokes thicker than 1px
   li=-1; lj=-1;
@@ -181,7 +287,7 @@ def chunkToFrags(im, x, y, w, h):
     frags.pop(0);
     frags.pop(0);
     frags.append(f);
-  elif (len(frags) > 2): # it's a crossroad, guess the intersection
+  elif (len(frags) > 2 and guessCenter): # it's a crossroad, guess the intersection
     ms = 0;
     mi = -1;
     mj = -1;
@@ -207,32 +313,20 @@ def chunkToFrags(im, x, y, w, h):
   return frags;
 
 
-# Trace skeleton from thinning result.
-# Algorithm:
-# 1. if chunk size is small enough, reach recursive bottom and turn it into segments
-# 2. attempt to split the chunk into 2 smaller chunks, either horizontall or vertically;
-#    find the best "seam" to carve along, and avoid possible degenerate cases
-# 3. recurse on each chunk, and merge their segments
-# 
+# find the best "seam" to split a chunk along, either horizontally or
+# vertically, avoiding possible degenerate cases
+#
 # @param im      the bitmap image
 # @param x       left of   chunk
 # @param y       top of    chunk
 # @param w       width of  chunk
 # @param h       height of chunk
 # @param csize   chunk size
-# @param maxIter maximum number of iterations
-# @param rects   if not null, will be populated with chunk bounding boxes (e.g. for visualization)
-# @return        an array of polylines
-# 
-def traceSkeleton(im, x, y, w, h, csize, maxIter, rects):
-  
-  frags = []
-  
-  if (maxIter == 0): # gameover
-    return frags;
-  if (w <= csize and h <= csize): # recursive bottom
-    frags += chunkToFrags(im,x,y,w,h);
-    return frags;
+# @param sat     summed-area table of im
+# @return        (first chunk, second chunk, seam coordinate, merge direction),
+#                or None if splitting failed
+#
+def splitChunk(im, x, y, w, h, csize, sat):
   
   ms = im.shape[0]+im.shape[1]; # number of white pixels on the seam, less the better
   mi = -1; # horizontal seam candidate
@@ -243,10 +337,7 @@ def traceSkeleton(im, x, y, w, h, csize, maxIter, rects):
       if (im[i,x]  or im[(i-1),x]  or im[i,x+w-1]  or im[(i-1),x+w-1]):
         continue
       
-      s = 0;
-      for j in range(x,x+w):
-        s += im[i,j];
-        s += im[(i-1),j];
+      s = regionSum(sat,x,i-1,w,2);
       
       if (s < ms):
         ms = s; mi = i;
@@ -260,10 +351,7 @@ def traceSkeleton(im, x, y, w, h, csize, maxIter, rects):
       if (im[y,j] or im[(y+h-1),j] or im[y,j-1] or im[(y+h-1),j-1]):
         continue
       
-      s = 0;
-      for i in range(y,y+h):
-        s += im[i,j];
-        s += im[i,j-1];
+      s = regionSum(sat,j-1,y,2,h);
       if (s < ms):
         ms = s;
         mi = -1; # horizontal seam is defeated
@@ -273,37 +361,252 @@ def traceSkeleton(im, x, y, w, h, csize, maxIter, rects):
         mi = -1;
         mj = j;
 
-  nf = []; # new fragments
   if (h > csize  and  mi != -1): # split top and bottom
-    L = [x,y,w,mi-y];    # new chunk bounding boxes
-    R = [x,mi,w,y+h-mi];
-    
-    if (notEmpty(im,L[0],L[1],L[2],L[3])): # if there are no white pixels, don't waste time
-      if(rects!=None):rects.append(L);
-      nf += traceSkeleton(im,L[0],L[1],L[2],L[3],csize,maxIter-1,rects) # recurse
-    
-    if (notEmpty(im,R[0],R[1],R[2],R[3])):
-      if(rects!=None):rects.append(R);
-      mergeFrags(nf,traceSkeleton(im,R[0],R[1],R[2],R[3],csize,maxIter-1,rects),mi,VERTICAL);
+    return [x,y,w,mi-y], [x,mi,w,y+h-mi], mi, VERTICAL
+  if (w > csize  and  mj != -1): # split left and right
+    return [x,y,mj-x,h], [mj,y,x+w-mj,h], mj, HORIZONTAL
+  return None
+
+
+# Trace skeleton from thinning result.
+# Algorithm:
+# 1. if chunk size is small enough, reach recursive bottom and turn it into segments
+# 2. attempt to split the chunk into 2 smaller chunks, either horizontall or vertically;
+#    find the best "seam" to carve along, and avoid possible degenerate cases
+# 3. recurse on each chunk, and merge their segments
+# 
+# @param im      the bitmap image
+# @param x       left of   chunk
+# @param y       top of    chunk
+# @param w       width of  chunk
+# @param h       height of chunk
+# @param csize   chunk size
+# @param maxIter maximum number of iterations
+# @param rects   if not null, will be populated with chunk bounding boxes (e.g. for visualization)
+# @param sat     summed-area table of im, built on the first call if not given
+# @return        an array of polylines (lists or deques of [x,y] points)
+# 
+def traceSkeleton(im, x, y, w, h, csize, maxIter, rects, sat=None):
+  
+  frags = []
+  if sat is None:
+    sat = integralImage(im);
+  
+  if (maxIter == 0): # gameover
+    return frags;
+  if (w <= csize and h <= csize): # recursive bottom
+    frags += chunkToFrags(im,x,y,w,h);
+    return frags;
+  
+  split = splitChunk(im,x,y,w,h,csize,sat);
+  
+  nf = []; # new fragments
+  if (split != None):
+    L, R, sx, dr = split; # new chunk bounding boxes, seam and merge direction
     
-  elif (w > csize  and  mj != -1): # split left and right
-    L = [x,y,mj-x,h];
-    R = [mj,y,x+w-mj,h];
-    if (notEmpty(im,L[0],L[1],L[2],L[3])):
+    if (notEmpty(im,L[0],L[1],L[2],L[3],sat)): # if there are no white pixels, don't waste time
       if(rects!=None):rects.append(L);
-      nf+=traceSkeleton(im,L[0],L[1],L[2],L[3],csize,maxIter-1,rects);
+      nf += traceSkeleton(im,L[0],L[1],L[2],L[3],csize,maxIter-1,rects,sat) # recurse
     
-    if (notEmpty(im,R[0],R[1],R[2],R[3])):
+    if (notEmpty(im,R[0],R[1],R[2],R[3],sat)):
       if(rects!=None):rects.append(R);
-      mergeFrags(nf,traceSkeleton(im,R[0],R[1],R[2],R[3],csize,maxIter-1,rects),mj,HORIZONTAL);
+      mergeFrags(nf,traceSkeleton(im,R[0],R[1],R[2],R[3],csize,maxIter-1,rects,sat),sx,dr);
     
   frags+=nf;
-  if (mi == -1  and  mj == -1): # splitting failed! do the recursive bottom instead
+  if (split == None): # splitting failed! do the recursive bottom instead
     frags += chunkToFrags(im,x,y,w,h);
   
   return frags
 
 
+# Trace skeleton from thinning result, iteratively.
+# Same algorithm as traceSkeleton, but the chunks are processed from an explicit
+# work queue instead of by recursion, so there is no depth limit and no per-call
+# overhead. Large chunks are split before small ones, so the chunk tree is
+# refined coarse to fine: when the time budget is spent, the chunks still queued
+# are turned into fragments directly and the partial result still covers the
+# whole image, just coarser where tracing did not finish. The fragments are
+# merged bottom up, in the order traceSkeleton would merge them. Without a time
+# budget the result is identical to traceSkeleton with an unlimited maxIter.
+#
+# @param im         the bitmap image
+# @param x          left of   chunk
+# @param y          top of    chunk
+# @param w          width of  chunk
+# @param h          height of chunk
+# @param csize      chunk size
+# @param rects      if not null, will be populated with chunk bounding boxes (e.g. for visualization)
+# @param timeBudget if set, stop splitting chunks after this many seconds and return the partial result
+# @param pending    if not null, will be populated with the bounding boxes of chunks left coarse in a partial result
+# @return           an array of polylines
+#
+def traceSkeletonQueue(im, x, y, w, h, csize, rects, timeBudget=None, pending=None):
+  
+  sat = integralImage(im);
+  deadline = None if timeBudget is None else time.time()+timeBudget;
+  
+  # chunk tree, indexed by chunk: bounding box, (seam, merge direction, first, second) and fragments;
+  # children are always appended after their parent
+  boxes = [[x,y,w,h]];
+  splits = [None];
+  frags = [None];
+  
+  queue = [(-w*h,0)]; # largest chunk first
+  while queue:
+    if (deadline != None and time.time() > deadline): # out of time, leave the rest out
+      break
+    n = heapq.heappop(queue)[1];
+    cx,cy,cw,ch = boxes[n];
+    
+    split = None;
+    if (cw > csize or ch > csize):
+      split = splitChunk(im,cx,cy,cw,ch,csize,sat);
+    if (split == None): # bottom, or splitting failed
+      frags[n] = chunkToFrags(im,cx,cy,cw,ch);
+      continue
+    
+    L, R, sx, dr = split;
+    children = [];
+    for c in (L,R):
+      if (notEmpty(im,c[0],c[1],c[2],c[3],sat)):
+        children.append(len(boxes));
+        heapq.heappush(queue,(-c[2]*c[3],len(boxes)));
+        boxes.append(c); splits.append(None); frags.append(None);
+      else:
+        children.append(-1);
+    splits[n] = (sx,dr,children[0],children[1]);
+  
+  for _,n in queue: # out of time: turn the remaining chunks into fragments directly
+    frags[n] = chunkToFrags(im,boxes[n][0],boxes[n][1],boxes[n][2],boxes[n][3],False);
+    if(pending!=None):pending.append(boxes[n]);
+  
+  # merge bottom up: children before their parents
+  for n in range(len(boxes)-1,-1,-1):
+    if (splits[n] == None):
+      continue
+    sx, dr, l, r = splits[n];
+    nf = [];
+    if (l != -1):
+      nf += frags[l]; frags[l] = None;
+    if (r != -1):
+      mergeFrags(nf,frags[r],sx,dr); frags[r] = None;
+    frags[n] = nf;
+  
+  if(rects!=None): # chunk bounding boxes in the order of the recursion
+    stack = [0];
+    while stack:
+      n = stack.pop();
+      if (n):
+        rects.append(boxes[n]);
+      if (splits[n] != None):
+        stack += [k for k in (splits[n][3],splits[n][2]) if k != -1];
+  
+  return frags[0]
+
+
+# image and summed-area table shared with the tile workers of traceSkeletonTiled
+tileShared = {};
+
+# attach a tile worker to the shared image and summed-area table
+# @param imSpec   (shared memory name, shape, dtype) of the image
+# @param satSpec  (shared memory name, shape, dtype) of the summed-area table
+def initTileWorker(imSpec, satSpec):
+  for key,(name,shape,dtype) in (('im',imSpec),('sat',satSpec)):
+    shm = shared_memory.SharedMemory(name=name);
+    tileShared[key+'Shm'] = shm; # keep the mapping alive
+    tileShared[key] = np.ndarray(shape,dtype,buffer=shm.buf);
+
+# trace one tile in a worker process
+# @param task  (x, y, w, h, csize, maxIter) of the tile
+# @return      polylines and chunk bounding boxes of the tile
+def traceTile(task):
+  x,y,w,h,csize,maxIter = task;
+  rects = [];
+  frags = traceSkeleton(tileShared['im'],x,y,w,h,csize,maxIter,rects,tileShared['sat']);
+  return frags, rects
+
+# split a chunk exactly like traceSkeleton would, until the chunks are no
+# larger than tileSize; the seams therefore avoid skeleton pixels where possible
+# @param tasks   populated with (x, y, w, h, csize, maxIter) of the tiles
+# @return        split tree: tile index for a leaf,
+#                [seam, merge direction, (rect, subtree) or None, (rect, subtree) or None] otherwise
+def planTiles(im, x, y, w, h, csize, maxIter, tileSize, sat, tasks):
+  split = None;
+  if (maxIter != 0 and (w > tileSize or h > tileSize) and (w > csize or h > csize)):
+    split = splitChunk(im,x,y,w,h,csize,sat);
+  if (split == None): # leaf, traced in one piece by a tile worker
+    tasks.append((x,y,w,h,csize,maxIter));
+    return len(tasks)-1
+  L, R, sx, dr = split;
+  node = [sx,dr];
+  for c in (L,R):
+    if (notEmpty(im,c[0],c[1],c[2],c[3],sat)):
+      node.append((c,planTiles(im,c[0],c[1],c[2],c[3],csize,maxIter-1,tileSize,sat,tasks)));
+    else:
+      node.append(None);
+  return node
+
+# merge the traced tiles back up the split tree, in the order traceSkeleton would
+def assembleTiles(node, results, rects):
+  if (isinstance(node,int)):
+    frags, tileRects = results[node];
+    if(rects!=None):rects += tileRects;
+    return frags
+  sx, dr, L, R = node;
+  nf = [];
+  if (L != None):
+    if(rects!=None):rects.append(L[0]);
+    nf += assembleTiles(L[1],results,rects);
+  if (R != None):
+    if(rects!=None):rects.append(R[0]);
+    mergeFrags(nf,assembleTiles(R[1],results,rects),sx,dr);
+  return nf
+
+# Trace skeleton in tiles on a process pool.
+# The top of the divide and conquer tree is split in the main process, down to
+# tiles no larger than tileSize; the tiles are traced in parallel and their
+# fragments merged along the seams with mergeFrags, so the result is identical
+# to traceSkeleton. Image and summed-area table are shared with the workers
+# through shared memory.
+#
+# @param tileSize  maximum width and height of a tile
+# @param processes number of worker processes, None for all cores, 1 to run traceSkeleton serially
+# @return          an array of polylines
+#
+def traceSkeletonTiled(im, x, y, w, h, csize, maxIter, rects, tileSize=1024, processes=None):
+  
+  if (processes == 1):
+    return traceSkeleton(im,x,y,w,h,csize,maxIter,rects)
+  
+  im = np.asarray(im);
+  satShape = (im.shape[0]+1,im.shape[1]+1);
+  satDtype = np.dtype(np.int32 if im.shape[0]*im.shape[1] < 2**31 else np.int64);
+  imShm = shared_memory.SharedMemory(create=True,size=max(im.nbytes,1));
+  satShm = shared_memory.SharedMemory(create=True,size=satShape[0]*satShape[1]*satDtype.itemsize);
+  try:
+    sharedIm = np.ndarray(im.shape,im.dtype,buffer=imShm.buf);
+    sharedIm[...] = im;
+    sat = integralImage(sharedIm,np.ndarray(satShape,satDtype,buffer=satShm.buf));
+    
+    tasks = [];
+    tree = planTiles(sharedIm,x,y,w,h,csize,maxIter,tileSize,sat,tasks);
+    
+    # schedule large tiles first, they take longest
+    order = sorted(range(len(tasks)),key=lambda k: -tasks[k][2]*tasks[k][3]);
+    with multiprocessing.Pool(processes,initializer=initTileWorker,
+                              initargs=((imShm.name,im.shape,im.dtype),(satShm.name,satShape,satDtype))) as pool:
+      traced = pool.map(traceTile,[tasks[k] for k in order],chunksize=1);
+    results = [None]*len(tasks);
+    for k,r in zip(order,traced):
+      results[k] = r;
+    
+    del sharedIm, sat # release the views before closing the shared memory
+    return assembleTiles(tree,results,rects)
+  finally:
+    imShm.close(); imShm.unlink();
+    satShm.close(); satShm.unlink();
+
+
 if __name__ == "__main__":
   import cv2
   import random
@@ -0,0 +1,138 @@
+import os
+import sys
+
+import numpy as np
+import geopandas as gpd
+import rasterio
+import shapely
+import pytest
+from rasterio import features
+from rasterio.transform import from_origin
+from scipy.interpolate import griddata
+from scipy.ndimage import gaussian_filter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import utils.raster_interpolation as raster_interpolation
+from utils.raster_interpolation import interpolate_geojson, read_contours, contour_grid, resample_lines, \
+    update_dem_incremental, interpolate_raster
+
+
+"""
+Regression tests of the DEM interpolation at real map coordinates (EPSG:2056, about 2.6e6 / 1.2e6).
+Run from 02_DEM with: python -m pytest _tests
+"""
+
+
+LV95_ORIGIN = (2600000.0, 1200000.0)
+
+
+def write_rings(path, origin, n=25, size=600, shift=None, heights=None, drop=()):
+    # concentric ellipses as contour lines, the innermost one is the highest; shift moves single rings in x
+    t = np.linspace(0, 2 * np.pi, 200)
+    shift, heights = shift or {}, heights or {}
+    rings = [k for k in range(n) if k not in drop]
+    geometries = [shapely.LineString(np.c_[origin[0] + size / 2 + shift.get(k, 0) + (10 + 11 * k) * np.cos(t),
+                                           origin[1] + size / 2 + (8 + 9 * k) * np.sin(t)]) for k in rings]
+    # a frame around the rings keeps the bounds fixed when rings are edited
+    geometries.append(shapely.LinearRing([origin, (origin[0] + size, origin[1]), (origin[0] + size, origin[1] + size),
+                                          (origin[0], origin[1] + size)]))
+    heights = [heights.get(k, 400 + 10 * (n - k)) for k in rings] + [0]
+    gpd.GeoDataFrame({'height': heights}, geometry=geometries, crs='EPSG:2056').to_file(path, driver='GeoJSON')
+
+
+def triangulated_all(path):
+    # number of points a full rebuild triangulates
+    gdf = read_contours(path)
+    return len(resample_lines(np.asarray(gdf[gdf['height'] > 0].geometry.values), 3)[0])
+
+
+@pytest.mark.parametrize('method', ['linear', 'cubic'])
+def test_interpolate_geojson_lv95_equals_local_origin(tmp_path, method):
+    # the same contour lines at LV95 coordinates and at the origin must give the same height map
+    heights = []
+    for name, origin in (('lv95', LV95_ORIGIN), ('local', (0.0, 0.0))):
+        write_rings(str(tmp_path / f"{name}.geojson"), origin)
+        interpolate_geojson(str(tmp_path / f"{name}.geojson"), str(tmp_path / f"{name}.tif"), method=method)
+        with rasterio.open(tmp_path / f"{name}.tif") as src:
+            heights.append(src.read(1))
+
+    assert heights[0].shape == heights[1].shape
+    np.testing.assert_allclose(heights[0], heights[1], atol=1e-2)
+
+
+
+def test_interpolate_geojson_cache_lv95(tmp_path):
+    # the cached triangulation gives the height map of griddata, a rerun at another resolution reuses it
+    path = str(tmp_path / "lv95.geojson")
+    write_rings(path, LV95_ORIGIN)
+    gdf = read_contours(path)
+    for resolution in (1, 2):
+        interpolate_geojson(path, str(tmp_path / "cached.tif"), resolution=resolution, cache_dir=str(tmp_path / "cache"))
+
+        transform, width, height = contour_grid(gdf, resolution)
+        lines = gdf[gdf['height'] > 0]
+        points, index = resample_lines(np.asarray(lines.geometry.values), 3)
+        values = lines['height'].to_numpy(np.float64)[index]
+        x, y = np.meshgrid((np.arange(width) + 0.5) * transform.a, (np.arange(height) + 0.5) * transform.e)
+        expected = griddata(points - (transform.c, transform.f), values, (x, y), fill_value=values.min())
+        expected = gaussian_filter(expected, sigma=3).astype(np.float32)
+
+        with rasterio.open(tmp_path / "cached.tif") as src:
+            np.testing.assert_array_equal(src.read(1), expected)
+    assert len(os.listdir(tmp_path / "cache")) == 1
+
+
+def test_update_dem_incremental_lv95(tmp_path, monkeypatch):
+    # after moving a ring, changing a height and dropping a ring the update equals a full rebuild up to the tolerance
+    # of the tiles that are left out
+    path, dem = str(tmp_path / "lv95.geojson"), str(tmp_path / "dem.tif")
+    write_rings(path, LV95_ORIGIN, size=1000)
+    update_dem_incremental(path, dem, tile_size=128)
+
+    write_rings(path, LV95_ORIGIN, size=1000, shift={8: 4}, heights={15: 503}, drop=(20,))
+    triangulated = []
+    delaunay = raster_interpolation.Delaunay
+    monkeypatch.setattr(raster_interpolation, 'Delaunay', lambda points: triangulated.append(len(points)) or
+                        delaunay(points))
+    update_dem_incremental(path, dem, tile_size=128, tolerance=0.05)
+    monkeypatch.undo()
+    interpolate_geojson(path, str(tmp_path / "full.tif"))
+    # the tiles are interpolated from the points around them, not from the triangulation of all points
+    assert triangulated and max(triangulated) < triangulated_all(path) / 3
+
+    with rasterio.open(dem) as updated, rasterio.open(tmp_path / "full.tif") as full:
+        updated, full = updated.read(1), full.read(1)
+    assert np.abs(updated - full).max() <= 0.05
+
+
+def test_update_dem_incremental_linear_only(tmp_path):
+    write_rings(str(tmp_path / "lv95.geojson"), LV95_ORIGIN)
+    with pytest.raises(ValueError):
+        update_dem_incremental(str(tmp_path / "lv95.geojson"), str(tmp_path / "dem.tif"), method='membrane')
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_interpolate_raster_tiled_equals_monolithic(tmp_path, monkeypatch, processes):
+    # rasterized rings, partly cut off by the border of the raster, leave large regions without contour pixels
+    write_rings(str(tmp_path / "rings.geojson"), (-500.0, 0.0), size=1200)
+    gdf = read_contours(str(tmp_path / "rings.geojson"))
+    gdf = gdf[gdf['height'] > 0]
+    contours = features.rasterize(zip(gdf.geometry, gdf['height']), out_shape=(600, 500),
+                                  transform=from_origin(0, 1200, 2, 2), dtype='float32')
+    with rasterio.open(tmp_path / "contours.tif", 'w', driver='GTiff', height=600, width=500, count=1,
+                       dtype='float32', crs='EPSG:2056', transform=from_origin(0, 1200, 2, 2)) as dst:
+        dst.write(contours, 1)
+
+    interpolate_raster(str(tmp_path / "contours.tif"), str(tmp_path / "monolithic.tif"))
+
+    # the tiles are evaluated on one triangulation of all contour pixels, none is triangulated on its own
+    triangulated = []
+    delaunay = raster_interpolation.Delaunay
+    monkeypatch.setattr(raster_interpolation, 'Delaunay', lambda points: triangulated.append(len(points)) or
+                        delaunay(points))
+    interpolate_raster(str(tmp_path / "contours.tif"), str(tmp_path / "tiled.tif"), tile_size=128,
+                       processes=processes)
+    assert triangulated == [np.count_nonzero(contours)]
+
+    with rasterio.open(tmp_path / "monolithic.tif") as monolithic, rasterio.open(tmp_path / "tiled.tif") as tiled:
+        np.testing.assert_array_equal(tiled.read(1), monolithic.read(1))
@@ -20,21 +20,42 @@ output_dir = '05_DEM/dem/'
 
 years = [1899] # 1899,1912,1930,1939,1975
 
+source = 'raster'   # 'raster' (rasterized contours of dem_01) or 'geojson' (contour lines, resampled every spacing m)
+spacing = 3         # distance between the points sampled along the contour lines (meters, source 'geojson')
+resolution = 1      # pixel size of the height map (meters, source 'geojson', as in dem_01)
+incremental = False # source 'geojson', method 'linear': only re-interpolate the tiles around changed lines
+method = 'linear'   # 'linear' (griddata + Gaussian smoothing), 'membrane' or 'thin_plate' (smooth surface solver)
+sigma = 3           # Gaussian smoothing of the griddata methods (pixels)
+cache_dir = None    # cache the triangulations of 'linear' in this directory (never evicted), None to disable
+tile_size = None    # interpolate in tiles of this size (pixels, multiple of 16) on a process pool, None for one piece
+processes = None    # worker processes of the tiled mode, None for all cores
+
 
 
 # -----------------------------------------------
 
-for year in tqdm(years):
-    input_raster_path = f"skeleton_{year}_heights.tif"
-    output_raster_path = f"height_map_{year}.tif"
+if __name__ == "__main__":
+    for year in tqdm(years):
+        input_raster_path = f"skeleton_{year}_heights.tif"
+        output_raster_path = f"height_map_{year}.tif"
 
 
-    input_raster_path_ = f"{base_path}{input_dir}{year}/{input_raster_path}"
-    output_raster_path_ = f"{base_path}{output_dir}{year}/{output_raster_path}"
+        input_raster_path_ = f"{base_path}{input_dir}{year}/{input_raster_path}"
+        output_raster_path_ = f"{base_path}{output_dir}{year}/{output_raster_path}"
 
-    ensure_directory_exists(f"{base_path}{output_dir}{year}")
+        ensure_directory_exists(f"{base_path}{output_dir}{year}")
 
 
-    interpolate_raster(input_raster_path_, output_raster_path_, method='linear')
+        if source == 'geojson' and incremental:
+            input_geojson_path_ = f"{base_path}{input_dir}{year}/skeleton_{year}_heights.geojson"
+            update_dem_incremental(input_geojson_path_, output_raster_path_, resolution=resolution, spacing=spacing,
+                                   method=method, sigma=sigma, cache_dir=cache_dir)
+        elif source == 'geojson':
+            input_geojson_path_ = f"{base_path}{input_dir}{year}/skeleton_{year}_heights.geojson"
+            interpolate_geojson(input_geojson_path_, output_raster_path_, resolution=resolution, spacing=spacing,
+                                method=method, sigma=sigma, cache_dir=cache_dir)
+        else:
+            interpolate_raster(input_raster_path_, output_raster_path_, method=method, sigma=sigma,
+                               tile_size=tile_size, processes=processes, cache_dir=cache_dir)
 
 #make_img_square(output_raster_path_.replace(".tif",".png"), output_raster_path_.replace('.tif', '_squared.png'))
\ No newline at end of file
@@ -1,7 +1,17 @@
 import rasterio
 import numpy as np
+import geopandas as gpd
+import hashlib
+import os
+import pickle
+import shutil
 from scipy.interpolate import griddata
+from scipy.spatial import Delaunay, ConvexHull
+from rasterio.windows import Window
+from multiprocessing import Pool
+import shapely
 from scipy.ndimage import gaussian_filter
+from .surface_solver import solve_surface
 import matplotlib.pyplot as plt
 from PIL import Image
 from osgeo import gdal, osr
@@ -9,7 +19,27 @@ from osgeo import gdal, osr
 
 
 
-def interpolate_raster(input_raster_path, output_raster_path,method='linear',sigma=3):
+def interpolate_raster(input_raster_path, output_raster_path,method='linear',sigma=3,tile_size=None,processes=None,cache_dir=None):
+    """
+    Interpolates a height map from the contour line pixels (non-zero pixels) of a raster and smooths it.
+
+    Parameters:
+    input_raster_path (str): Path to the rasterized contour lines.
+    output_raster_path (str): Path of the output GeoTIFF (a PNG preview is saved next to it).
+    method (str): Interpolation method of griddata ('linear', 'nearest' or 'cubic'), or 'membrane' / 'thin_plate' to
+        solve a smooth surface through the contour pixels (see surface_solver.solve_surface). The surfaces are smooth
+        and defined outside the convex hull of the contours, they are not blurred with the Gaussian filter.
+    sigma (float): Sigma of the Gaussian smoothing in pixels.
+    tile_size (int, optional): If set, the height map is interpolated in tiles of this size on a process pool and
+        written window by window into a tiled GeoTIFF (see interpolate_raster_tiled). Only for method 'linear'.
+    processes (int, optional): Number of worker processes for the tiled mode, None for all cores.
+    cache_dir (str, optional): Directory of the triangulation cache (see load_or_build_triangulation), used by the
+        'linear' interpolation. Reruns on the same contour pixels skip the triangulation.
+    """
+    if tile_size:
+        interpolate_raster_tiled(input_raster_path, output_raster_path, method, sigma, tile_size, processes, cache_dir)
+        return
+
     # Step 1: Open the input raster file
     with rasterio.open(input_raster_path) as src:
         raster_data = src.read(1)  # Read the first band (grayscale)
@@ -18,24 +48,33 @@ def interpolate_raster(input_raster_path, output_raster_path,method='linear',sig
         width = src.width
         height = src.height
 
-    # Step 2: Identify the pixels that are non-zero (representing contour lines)
-    y_indices, x_indices = np.indices(raster_data.shape)
-    non_zero_mask = raster_data > 0
-    non_zero_x = x_indices[non_zero_mask]
-    non_zero_y = y_indices[non_zero_mask]
-    non_zero_values = raster_data[non_zero_mask]
+    if method in ('membrane', 'thin_plate'):
+        # Steps 2-3: Solve a smooth surface with the contour pixels as fixed values, no smoothing needed
+        smoothed_raster = solve_surface(raster_data, raster_data > 0, surface=method)
+    else:
+        # Step 2: Identify the pixels that are non-zero (representing contour lines)
+        non_zero_mask = raster_data > 0
+        non_zero_y, non_zero_x = np.nonzero(non_zero_mask)
+        non_zero_values = raster_data[non_zero_mask]
     
-    min_value = np.min(non_zero_values)
+        min_value = np.min(non_zero_values)
     
 
-    # Step 3: Perform interpolation to fill in the gaps using griddata
-    interpolated_raster = griddata(
-        (non_zero_x, non_zero_y), non_zero_values,
-        (x_indices, y_indices), method=method, fill_value=min_value
-    )
+        # Step 3: Perform interpolation to fill in the gaps
+        if method == 'linear' and cache_dir:
+            # on the cached triangulation of the contour pixels, row block by row block
+            points = np.c_[non_zero_x, non_zero_y].astype(np.float64)
+            tri = load_or_build_triangulation(points, cache_dir)
+            interpolated_raster = interpolate_grid(tri, non_zero_values, np.arange(width), np.arange(height), min_value)
+        else:
+            y_indices, x_indices = np.indices(raster_data.shape)
+            interpolated_raster = griddata(
+                (non_zero_x, non_zero_y), non_zero_values,
+                (x_indices, y_indices), method=method, fill_value=min_value
+            )
 
-    # Optional: Apply a Gaussian filter to smooth the interpolated raster
-    smoothed_raster = gaussian_filter(interpolated_raster, sigma=sigma)
+        # Optional: Apply a Gaussian filter to smooth the interpolated raster
+        smoothed_raster = gaussian_filter(interpolated_raster, sigma=sigma)
 
     # Step 4: Save the interpolated raster to a new GeoTIFF file with one band
     with rasterio.open(
@@ -59,6 +98,602 @@ def interpolate_raster(input_raster_path, output_raster_path,method='linear',sig
 
 
 
+def evaluate_triangulation(tri, values, xi):
+    """
+    Linear interpolation of values at the vertices of a triangulation.
+
+    Parameters:
+    tri (Delaunay): Triangulation of the data points.
+    values (ndarray): Value per data point (in the order of tri.points).
+    xi (ndarray): (M, 2) coordinates to interpolate at.
+
+    Returns:
+    tuple: (interpolated values with NaN outside the convex hull, simplex per point of xi).
+    """
+    simplex = tri.find_simplex(xi)
+    inside = simplex >= 0
+
+    # barycentric coordinates in the containing triangle
+    transform = tri.transform[simplex[inside]]
+    bary = np.einsum('ijk,ik->ij', transform[:, :2], xi[inside] - transform[:, 2])
+    weights = np.c_[bary, 1 - bary.sum(axis=1)]
+
+    result = np.full(len(xi), np.nan)
+    result[inside] = (values[tri.simplices[simplex[inside]]] * weights).sum(axis=1)
+    return result, simplex
+
+
+def load_or_build_triangulation(points, cache_dir=None):
+    """
+    Loads the Delaunay triangulation of points from the cache or builds and stores it. The cache file is keyed by
+    the SHA-1 of the point coordinates, so only the values (heights) and the evaluation grid may change between
+    runs that reuse it. Qhull loses precision far from the origin: pass map coordinates relative to a fixed origin
+    near the data (e.g. the corner of the bounds, see interpolate_geojson) and evaluate in the same frame.
+
+    Parameters:
+    points (ndarray): (N, 2) coordinates of the data points, relative to a fixed origin.
+    cache_dir (str, optional): Directory of the cache files (delaunay_<sha1>.pkl), None to disable caching.
+        Files are never evicted, the directory grows by one file per new point set.
+
+    Returns:
+    Delaunay: Triangulation of the points (with its barycentric transform).
+    """
+    points = np.ascontiguousarray(points, np.float64)
+    cache_path = None
+    if cache_dir:
+        key = hashlib.sha1(points.tobytes()).hexdigest()
+        cache_path = os.path.join(cache_dir, f"delaunay_{key}.pkl")
+        if os.path.exists(cache_path):
+            with open(cache_path, 'rb') as f:
+                tri = pickle.load(f)
+            print(f"Triangulation loaded from {cache_path}")
+            return tri
+
+    tri = Delaunay(points)
+    tri.transform  # computed lazily, store it with the triangulation
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(cache_path, 'wb') as f:
+            pickle.dump(tri, f, protocol=pickle.HIGHEST_PROTOCOL)
+        print(f"Triangulation saved to {cache_path}")
+    return tri
+
+
+def points_hull(points):
+    """
+    Convex hull of data points, slightly grown so that points on its boundary lie inside.
+
+    Parameters:
+    points (ndarray): (N, 2) coordinates of the data points.
+
+    Returns:
+    Polygon: The convex hull.
+    """
+    scale = np.abs(points).max()
+    return shapely.Polygon(points[ConvexHull(points).vertices]).buffer(1e-9 * scale)
+
+
+def triangulation_hull(tri):
+    """
+    Convex hull of the data points of a triangulation (see points_hull).
+
+    Parameters:
+    tri (Delaunay): Triangulation of the data points.
+
+    Returns:
+    Polygon: The convex hull.
+    """
+    return points_hull(tri.points)
+
+
+def interpolate_grid(tri, values, x, y, fill_value, chunk_rows=256, hull=None):
+    """
+    Evaluates the linear interpolation on a triangulation at the nodes of a grid, chunk_rows grid rows at a time.
+
+    Parameters:
+    tri (Delaunay): Triangulation of the data points (e.g. from load_or_build_triangulation).
+    values (ndarray): Value per data point.
+    x (ndarray): Coordinates of the grid columns.
+    y (ndarray): Coordinates of the grid rows.
+    fill_value (float): Value outside the convex hull of the data points.
+    chunk_rows (int): Number of grid rows evaluated at once.
+    hull (Polygon, optional): Convex hull of the data points (see triangulation_hull), to evaluate many grids on one
+        triangulation.
+
+    Returns:
+    ndarray: float64 array of shape (len(y), len(x)).
+    """
+    values = np.asarray(values, np.float64)
+    # find_simplex is slow for points outside the triangulation, these are sorted out with the convex hull first
+    if hull is None:
+        hull = triangulation_hull(tri)
+
+    result = np.empty((len(y), len(x)))
+    for row0 in range(0, len(y), chunk_rows):
+        rows = y[row0:row0 + chunk_rows]
+        xi = np.c_[np.tile(x, len(rows)), np.repeat(rows, len(x))].astype(np.float64)
+        if shapely.contains(hull, shapely.box(x.min(), rows.min(), x.max(), rows.max())):
+            inside = np.ones(len(xi), bool)  # the whole chunk lies inside
+        else:
+            inside = shapely.contains_xy(hull, xi[:, 0], xi[:, 1])
+        chunk = np.full(len(xi), fill_value, np.float64)
+        chunk[inside] = evaluate_triangulation(tri, values, xi[inside])[0]
+        chunk[np.isnan(chunk)] = fill_value
+        result[row0:row0 + len(rows)] = chunk.reshape(len(rows), len(x))
+    return result
+
+
+# triangulation of the contour pixels shared with the tile workers of interpolate_raster_tiled
+tile_shared = {}
+
+
+def init_tile_worker(tri, values, hull, shape):
+    """
+    Attaches a tile worker of interpolate_raster_tiled to the triangulation of all contour pixels.
+
+    Parameters:
+    tri (Delaunay): Triangulation of the contour pixels in (col, row) pixel coordinates.
+    values (ndarray): Height per contour pixel.
+    hull (Polygon): Convex hull of the contour pixels (see triangulation_hull).
+    shape (tuple): (height, width) of the raster.
+    """
+    tile_shared.update(tri=tri, values=values, hull=hull, shape=shape)
+
+
+def interpolate_tile(task):
+    """
+    Interpolates and smooths one output tile of interpolate_raster_tiled on the shared triangulation (see
+    init_tile_worker). The tile is interpolated with a margin for the Gaussian filter, so it equals the same window
+    of the monolithic result.
+
+    Parameters:
+    task (tuple): ((row0, row1, col0, col1) of the tile (end exclusive), sigma, fill value).
+
+    Returns:
+    tuple: The tile window and the float32 tile.
+    """
+    (row0, row1, col0, col1), sigma, fill_value = task
+    height, width = tile_shared['shape']
+    radius = int(4 * sigma + 0.5) if sigma else 0  # reach of gaussian_filter (truncate=4)
+
+    # pixels to interpolate: the tile and the reach of the Gaussian filter
+    r0, r1 = max(row0 - radius, 0), min(row1 + radius, height)
+    c0, c1 = max(col0 - radius, 0), min(col1 + radius, width)
+    interpolated = interpolate_grid(tile_shared['tri'], tile_shared['values'], np.arange(c0, c1), np.arange(r0, r1),
+                                    fill_value, hull=tile_shared['hull'])
+
+    # Optional: Apply a Gaussian filter to smooth the interpolated raster
+    if sigma:
+        interpolated = gaussian_filter(interpolated, sigma=sigma)
+
+    return (row0, row1, col0, col1), interpolated[row0 - r0:row1 - r0, col0 - c0:col1 - c0].astype(np.float32)
+
+
+def interpolate_raster_tiled(input_raster_path, output_raster_path, method='linear', sigma=3, tile_size=1024,
+                             processes=None, cache_dir=None):
+    """
+    Tiled version of interpolate_raster: the contour pixels are read block by block and triangulated once, then
+    every output tile is evaluated on that triangulation in a worker process (see interpolate_tile) and written into
+    a tiled GeoTIFF window by window, so no full-size coordinate arrays or float64 height map are built. The result
+    equals the monolithic interpolation.
+
+    Parameters:
+    input_raster_path (str): Path to the rasterized contour lines.
+    output_raster_path (str): Path of the output GeoTIFF (a PNG preview is saved next to it).
+    method (str): Interpolation method, only 'linear' is supported.
+    sigma (float): Sigma of the Gaussian smoothing in pixels.
+    tile_size (int): Size of the output tiles in pixels (a multiple of 16).
+    processes (int, optional): Number of worker processes, None for all cores, 1 to run in this process.
+    cache_dir (str, optional): Directory of the triangulation cache (see load_or_build_triangulation).
+    """
+    if method != 'linear':
+        raise ValueError("The tiled interpolation supports method='linear' only.")
+
+    with rasterio.open(input_raster_path) as src:
+        profile = src.profile
+        height, width = src.height, src.width
+
+        # contour pixels, read block by block
+        points, values = [], []
+        for _, window in src.block_windows(1):
+            data = src.read(1, window=window)
+            y_indices, x_indices = np.nonzero(data > 0)
+            points.append(np.c_[x_indices + window.col_off, y_indices + window.row_off])
+            values.append(data[y_indices, x_indices])
+
+    # in row-major order like np.nonzero on the whole raster, so that the triangulation is the monolithic one
+    points, values = np.concatenate(points), np.concatenate(values).astype(np.float64)
+    order = np.lexsort((points[:, 0], points[:, 1]))
+    points, values = points[order].astype(np.float64), values[order]
+    tri = load_or_build_triangulation(points, cache_dir)
+    hull = triangulation_hull(tri)
+
+    # fill value outside the convex hull: the lowest contour height
+    tasks = [((row0, min(row0 + tile_size, height), col0, min(col0 + tile_size, width)), sigma, float(values.min()))
+             for row0 in range(0, height, tile_size) for col0 in range(0, width, tile_size)]
+
+    profile.update(driver='GTiff', count=1, dtype='float32', nodata=None, tiled=True,
+                   blockxsize=min(tile_size, 512), blockysize=min(tile_size, 512))
+
+    with rasterio.open(output_raster_path, 'w', **profile) as dst:
+        if processes == 1:
+            init_tile_worker(tri, values, hull, (height, width))
+            for (row0, row1, col0, col1), tile in map(interpolate_tile, tasks):
+                dst.write(tile, 1, window=Window(col0, row0, col1 - col0, row1 - row0))
+            tile_shared.clear()
+        else:
+            with Pool(processes, initializer=init_tile_worker, initargs=(tri, values, hull, (height, width))) as pool:
+                for (row0, row1, col0, col1), tile in pool.imap_unordered(interpolate_tile, tasks):
+                    dst.write(tile, 1, window=Window(col0, row0, col1 - col0, row1 - row0))
+
+    print(f"Interpolated raster saved to {output_raster_path}")
+
+    convert_tif_to_png(output_raster_path, output_raster_path.replace('.tif', '.png'))
+
+
+def resample_lines(geometries, spacing):
+    """
+    Samples points along lines at (at most) a fixed spacing, both line ends included.
+
+    Parameters:
+    geometries (ndarray): (Multi)LineStrings.
+    spacing (float): Maximum distance between consecutive points along a line, in coordinate units.
+
+    Returns:
+    tuple: ((N, 2) coordinates of the points, index of the geometry of every point).
+    """
+    lines, geometry_index = shapely.get_parts(geometries, return_index=True)
+    lengths = shapely.length(lines)
+    counts = np.ceil(lengths / spacing).astype(np.int64) + 1
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    line_index = np.repeat(np.arange(len(lines)), counts)
+    step = lengths / np.maximum(counts - 1, 1)
+    distances = (np.arange(counts.sum()) - offsets[line_index]) * step[line_index]
+
+    points = shapely.line_interpolate_point(lines[line_index], distances)
+    return shapely.get_coordinates(points), geometry_index[line_index]
+
+
+def read_contours(geojson_path, height_attribute='height'):
+    """
+    Reads the valid contour lines of a GeoJSON, like geojson_to_tiff.
+
+    Parameters:
+    geojson_path (str): Path to the contour lines with heights.
+    height_attribute (str): Name of the height attribute.
+
+    Returns:
+    GeoDataFrame: The valid features.
+    """
+    gdf = gpd.read_file(geojson_path)
+    if height_attribute not in gdf.columns:
+        raise ValueError(f"GeoJSON must have a {height_attribute} attribute for heights")
+    return gdf[gdf.geometry.is_valid]
+
+
+def contour_grid(gdf, resolution):
+    """
+    The raster grid geojson_to_tiff creates for contour lines.
+
+    Parameters:
+    gdf (GeoDataFrame): Contour lines (see read_contours).
+    resolution (float): Pixel size in meters.
+
+    Returns:
+    tuple: (affine transform, width, height).
+    """
+    minx, miny, maxx, maxy = gdf.total_bounds
+    width = int((maxx - minx) / resolution)
+    height = int((maxy - miny) / resolution)
+    return rasterio.transform.from_bounds(minx, miny, maxx, maxy, width, height), width, height
+
+
+def interpolate_geojson(geojson_path, output_raster_path, resolution=1, spacing=3, method='linear', sigma=3,
+                        height_attribute='height', cache_dir=None):
+    """
+    Interpolates a height map directly from the height-tagged contour lines of a GeoJSON, without rasterizing them
+    first. Every line is resampled every `spacing` meters and the height map is interpolated from these points at the
+    pixel centres of the grid geojson_to_tiff would create (same bounds and resolution), then smoothed.
+
+    Parameters:
+    geojson_path (str): Path to the contour lines with heights (e.g. skeleton_{year}_heights.geojson).
+    output_raster_path (str): Path of the output GeoTIFF (a PNG preview is saved next to it).
+    resolution (float): Pixel size in meters.
+    spacing (float): Distance between the points sampled along the lines in meters.
+    method (str): Interpolation method of griddata ('linear', 'nearest' or 'cubic'), or 'membrane' / 'thin_plate'
+        (the points are snapped to their pixels as fixed values, see surface_solver.solve_surface, no smoothing).
+    sigma (float): Sigma of the Gaussian smoothing in pixels.
+    height_attribute (str): Name of the height attribute, lines with height 0 are ignored.
+    cache_dir (str, optional): Directory of the triangulation cache for method 'linear' (see
+        load_or_build_triangulation). The points are taken relative to the top left corner of the bounds of the
+        lines, which does not depend on the resolution, so reruns with another resolution reuse it.
+    """
+    # Step 1: Read the contour lines, the grid is the one of geojson_to_tiff
+    gdf = read_contours(geojson_path, height_attribute)
+    transform, width, height = contour_grid(gdf, resolution)
+    minx, maxy = transform.c, transform.f
+
+    # Step 2: Sample points along the lines
+    gdf = gdf[gdf[height_attribute] > 0]
+    points, index = resample_lines(np.asarray(gdf.geometry.values), spacing)
+    values = gdf[height_attribute].to_numpy(np.float64)[index]
+    print(f"{len(points)} points sampled along {len(gdf)} lines")
+
+    # Step 3: Interpolate at the pixel centres
+    if method in ('membrane', 'thin_plate'):
+        cols = np.clip(((points[:, 0] - minx) / transform.a).astype(np.int64), 0, width - 1)
+        rows = np.clip(((points[:, 1] - maxy) / transform.e).astype(np.int64), 0, height - 1)
+        known = np.zeros((height, width), bool)
+        raster = np.zeros((height, width))
+        known[rows, cols] = True
+        raster[rows, cols] = values
+        smoothed_raster = solve_surface(raster, known, surface=method)
+    else:
+        # Qhull loses precision at map coordinates (about 2.6e6 / 1.2e6 in EPSG:2056) and builds other triangles,
+        # so the points and the pixel centres are taken relative to the top left corner of the bounds
+        points = points - (minx, maxy)
+        x = (np.arange(width) + 0.5) * transform.a
+        y = (np.arange(height) + 0.5) * transform.e
+        if method == 'linear':
+            tri = load_or_build_triangulation(points, cache_dir)
+            interpolated_raster = interpolate_grid(tri, values, x, y, values.min())
+        else:
+            x_grid, y_grid = np.meshgrid(x, y)
+            interpolated_raster = griddata(points, values, (x_grid, y_grid), method=method, fill_value=values.min())
+            del x_grid, y_grid
+
+        # Optional: Apply a Gaussian filter to smooth the interpolated raster
+        smoothed_raster = gaussian_filter(interpolated_raster, sigma=sigma)
+
+    # Step 4: Save the interpolated raster to a new GeoTIFF file with one band
+    with rasterio.open(
+        output_raster_path,
+        'w',
+        driver='GTiff',
+        height=height,
+        width=width,
+        count=1,
+        dtype='float32',
+        crs='EPSG:2056',
+        transform=transform
+    ) as dst:
+        dst.write(smoothed_raster.astype(np.float32), 1)
+
+    print(f"Interpolated raster saved to {output_raster_path}")
+
+    convert_tif_to_png(output_raster_path, output_raster_path.replace('.tif', '.png'))
+
+
+def circumcircles_inside(tri, simplices, x0, y0, x1, y1, hull):
+    """
+    Checks if the circumcircles of triangles lie inside a window. A Delaunay triangle of the data points inside the
+    window whose circumcircle lies inside the window is also a triangle of the triangulation of all data points.
+    Only the part of a circle inside the convex hull of all data points matters, there are no data points outside.
+
+    Parameters:
+    tri (Delaunay): Triangulation of the data points of the window.
+    simplices (ndarray): Indices of the triangles to check.
+    x0, y0, x1, y1 (float): The open window: all data points outside it have x <= x0, x >= x1, y <= y0 or y >= y1.
+    hull (Polygon): Convex hull of all data points.
+
+    Returns:
+    bool: True if all circumcircles lie inside the window.
+    """
+    corners = tri.points[tri.simplices[simplices]]
+    a, b, c = corners[:, 0], corners[:, 1], corners[:, 2]
+    d = 2 * (a[:, 0] * (b[:, 1] - c[:, 1]) + b[:, 0] * (c[:, 1] - a[:, 1]) + c[:, 0] * (a[:, 1] - b[:, 1]))
+    if np.any(d == 0):
+        return False
+    na, nb, nc = (a ** 2).sum(axis=1), (b ** 2).sum(axis=1), (c ** 2).sum(axis=1)
+    ux = (na * (b[:, 1] - c[:, 1]) + nb * (c[:, 1] - a[:, 1]) + nc * (a[:, 1] - b[:, 1])) / d
+    uy = (na * (c[:, 0] - b[:, 0]) + nb * (a[:, 0] - c[:, 0]) + nc * (b[:, 0] - a[:, 0])) / d
+    r = np.hypot(a[:, 0] - ux, a[:, 1] - uy)
+
+    # bounding boxes of the circles, clipped to the bounds of the hull
+    hx0, hy0, hx1, hy1 = hull.bounds
+    box = np.c_[np.maximum(ux - r, hx0), np.maximum(uy - r, hy0), np.minimum(ux + r, hx1), np.minimum(uy + r, hy1)]
+    outside = ~((box[:, 0] > x0) & (box[:, 1] > y0) & (box[:, 2] < x1) & (box[:, 3] < y1))
+    if np.any(outside):
+        # exact test for the rest: the circles (as circumscribed polygons) clipped to the hull
+        segments = 16
+        circles = shapely.buffer(shapely.points(ux[outside], uy[outside]),
+                                 r[outside] / np.cos(np.pi / (4 * segments)) + 1e-6, quad_segs=segments)
+        box = shapely.bounds(shapely.intersection(circles, hull))
+        if not np.all(np.isnan(box[:, 0]) | ((box[:, 0] > x0) & (box[:, 1] > y0) & (box[:, 2] < x1) & (box[:, 3] < y1))):
+            return False
+    return True
+
+
+def interpolate_window(points, values, x, y, fill_value, hull, halo, max_halo):
+    """
+    Evaluates the linear interpolation on the triangulation of all data points at the nodes of a small grid, from
+    the data points within a halo around the grid only. The halo is doubled until every triangle used lies inside
+    the window with its circumcircle, so that the triangles are those of the triangulation of all data points.
+
+    Parameters:
+    points (ndarray): (N, 2) coordinates of all data points.
+    values (ndarray): Value per data point.
+    x (ndarray): Coordinates of the grid columns.
+    y (ndarray): Coordinates of the grid rows.
+    fill_value (float): Value outside the convex hull of all data points.
+    hull (Polygon): Convex hull of all data points.
+    halo (float): Initial margin of the window around the grid, in the units of the coordinates.
+    max_halo (float): Largest margin tried.
+
+    Returns:
+    ndarray: float64 array of shape (len(y), len(x)), None if the window would need a margin above max_halo.
+    """
+    xi = np.c_[np.tile(x, len(y)), np.repeat(y, len(x))].astype(np.float64)
+    in_hull = shapely.contains_xy(hull, xi[:, 0], xi[:, 1])
+    result = np.full(len(xi), fill_value, np.float64)
+    if not np.any(in_hull):
+        return result.reshape(len(y), len(x))
+
+    while halo <= max_halo:
+        x0, x1 = min(x.min(), x.max()) - halo, max(x.min(), x.max()) + halo
+        y0, y1 = min(y.min(), y.max()) - halo, max(y.min(), y.max()) + halo
+        inside = (points[:, 0] > x0) & (points[:, 0] < x1) & (points[:, 1] > y0) & (points[:, 1] < y1)
+        try:
+            tri = Delaunay(points[inside])
+        except Exception:
+            tri = None  # less than 3 or collinear points
+        if tri is not None:
+            interpolated, simplex = evaluate_triangulation(tri, values[inside], xi[in_hull])
+            if np.all(simplex >= 0) and (not len(simplex) or
+                                         circumcircles_inside(tri, np.unique(simplex), x0, y0, x1, y1, hull)):
+                result[in_hull] = interpolated
+                return result.reshape(len(y), len(x))
+        halo *= 2
+    return None
+
+
+def feature_keys(gdf, height_attribute='height'):
+    """
+    Identifies features by their geometry and height.
+
+    Parameters:
+    gdf (GeoDataFrame): Contour lines.
+    height_attribute (str): Name of the height attribute.
+
+    Returns:
+    ndarray: SHA-1 of the WKB geometry and the height of every feature.
+    """
+    wkb = shapely.to_wkb(np.asarray(gdf.geometry.values))
+    heights = gdf[height_attribute].to_numpy(np.float64)
+    return np.array([hashlib.sha1(w + h.tobytes()).hexdigest() for w, h in zip(wkb, heights)])
+
+
+def update_dem_incremental(geojson_path, dem_path, resolution=1, spacing=3, method='linear', sigma=3,
+                           height_attribute='height', cache_dir=None, tile_size=256, tolerance=0.05, snapshot_path=None):
+    """
+    Updates a height map of interpolate_geojson (method 'linear') after edits of the contour lines, re-interpolating
+    only the tiles around the changes.
+
+    The contour lines of the last run are kept as a snapshot next to the height map. The features of the GeoJSON are
+    compared with the snapshot by geometry and height (see feature_keys). The tiles within the reach of the Gaussian
+    filter of an added, removed or changed line are re-interpolated in the frame of interpolate_geojson (relative to
+    the top left corner of the bounds) and written into the existing height map. Every tile is interpolated from the
+    points within a halo of 32 pixels around it, doubled up to 2 * tile_size until its triangles are those of the
+    triangulation of all points (see interpolate_window); only tiles in regions with contours further apart fall
+    back to the triangulation of all points. Where a tile changed by more than tolerance, its neighbours are
+    re-interpolated as well, until the changes have faded out. The updated tiles equal those of a full rebuild.
+    Without a previous run, if the bounds of the contour lines or the lowest height (the fill value outside the
+    contours) changed, the height map is rebuilt completely.
+
+    Parameters:
+    geojson_path (str): Path to the contour lines with heights (e.g. skeleton_{year}_heights.geojson).
+    dem_path (str): Path of the height map GeoTIFF (a PNG preview is saved next to it).
+    resolution (float): Pixel size in meters.
+    spacing (float): Distance between the points sampled along the lines in meters.
+    method (str): Interpolation method, only 'linear' is supported.
+    sigma (float): Sigma of the Gaussian smoothing in pixels.
+    height_attribute (str): Name of the height attribute, lines with height 0 are ignored.
+    cache_dir (str, optional): Directory of the triangulation cache (see load_or_build_triangulation), used by full
+        rebuilds and the fallback triangulation of all points.
+    tile_size (int): Size of the updated tiles in pixels.
+    tolerance (float): Height change of a tile above which its neighbours are updated too.
+    snapshot_path (str, optional): Path of the snapshot of the contour lines, next to the height map by default.
+    """
+    if method != 'linear':
+        raise ValueError("The incremental update supports method='linear' only.")
+    if snapshot_path is None:
+        snapshot_path = dem_path.replace('.tif', '_contours.geojson')
+
+    def rebuild(reason):
+        print(f"Rebuilding {dem_path} completely: {reason}")
+        interpolate_geojson(geojson_path, dem_path, resolution, spacing, 'linear', sigma, height_attribute, cache_dir)
+        shutil.copyfile(geojson_path, snapshot_path)
+
+    if not os.path.exists(dem_path) or not os.path.exists(snapshot_path):
+        rebuild("no previous height map")
+        return
+
+    new = read_contours(geojson_path, height_attribute)
+    old = read_contours(snapshot_path, height_attribute)
+    transform, width, height = contour_grid(new, resolution)
+    with rasterio.open(dem_path) as src:
+        if src.shape != (height, width) or not src.transform.almost_equals(transform):
+            rebuild("the bounds of the contour lines changed")
+            return
+
+    # changed features
+    new_keys, old_keys = feature_keys(new, height_attribute), feature_keys(old, height_attribute)
+    added = new[~np.isin(new_keys, old_keys)]
+    removed = old[~np.isin(old_keys, new_keys)]
+    print(f"{len(added)} added and {len(removed)} removed features")
+
+    new = new[new[height_attribute] > 0]
+    old = old[old[height_attribute] > 0]
+    if new[height_attribute].min() != old[height_attribute].min():
+        rebuild("the lowest contour height changed")
+        return
+
+    changed = np.concatenate([np.asarray(added[added[height_attribute] > 0].geometry.values),
+                              np.asarray(removed[removed[height_attribute] > 0].geometry.values)])
+
+    if len(changed):
+        # the points of interpolate_geojson: points and pixel centres relative to the top left corner
+        points, index = resample_lines(np.asarray(new.geometry.values), spacing)
+        values = new[height_attribute].to_numpy(np.float64)[index]
+        points = points - (transform.c, transform.f)
+        hull = points_hull(points)
+        tri = None  # triangulation of all points, only built for tiles whose window would grow too large
+        x = (np.arange(width) + 0.5) * transform.a
+        y = (np.arange(height) + 0.5) * transform.e
+
+        # tiles within the reach of the Gaussian filter of a changed line (not of its bounding box: a changed ring
+        # around a hill must not touch the tiles inside it)
+        radius = int(4 * sigma + 0.5) if sigma else 0  # reach of gaussian_filter (truncate=4)
+        n_rows, n_cols = -(-height // tile_size), -(-width // tile_size)
+        ty, tx = np.divmod(np.arange(n_rows * n_cols), n_cols)
+        tiles = shapely.box(transform.c + (tx * tile_size - radius - 1) * transform.a,
+                            transform.f + (np.minimum((ty + 1) * tile_size, height) + radius + 1) * transform.e,
+                            transform.c + (np.minimum((tx + 1) * tile_size, width) + radius + 1) * transform.a,
+                            transform.f + (ty * tile_size - radius - 1) * transform.e)
+        touched = np.unique(shapely.STRtree(changed).query(tiles, predicate='intersects')[0])
+        queue = set(zip(ty[touched].tolist(), tx[touched].tolist()))
+
+        done = set()
+        fallback = 0
+        with rasterio.open(dem_path, 'r+') as dst:
+            while queue:
+                ty, tx = queue.pop()
+                done.add((ty, tx))
+                row0, col0 = ty * tile_size, tx * tile_size
+                row1, col1 = min(row0 + tile_size, height), min(col0 + tile_size, width)
+
+                # the tile with the reach of the Gaussian filter, like the full height map
+                r0, r1 = max(row0 - radius, 0), min(row1 + radius, height)
+                c0, c1 = max(col0 - radius, 0), min(col1 + radius, width)
+                data = interpolate_window(points, values, x[c0:c1], y[r0:r1], values.min(), hull,
+                                          32 * transform.a, 2 * tile_size * transform.a)
+                if data is None:
+                    if tri is None:
+                        tri = load_or_build_triangulation(points, cache_dir)
+                    data = interpolate_grid(tri, values, x[c0:c1], y[r0:r1], values.min(), hull=hull)
+                    fallback += 1
+                if sigma:
+                    data = gaussian_filter(data, sigma=sigma)
+                data = data[row0 - r0:row1 - r0, col0 - c0:col1 - c0].astype(np.float32)
+
+                window = Window(col0, row0, col1 - col0, row1 - row0)
+                change = np.abs(dst.read(1, window=window) - data).max()
+                dst.write(data, 1, window=window)
+
+                if change > tolerance:
+                    for dy in (-1, 0, 1):
+                        for dx in (-1, 0, 1):
+                            neighbour = (ty + dy, tx + dx)
+                            if 0 <= neighbour[0] < n_rows and 0 <= neighbour[1] < n_cols and neighbour not in done:
+                                queue.add(neighbour)
+
+        print(f"Updated {len(done)} of {n_rows * n_cols} tiles of {dem_path} "
+              f"({fallback} on the triangulation of all points)")
+        convert_tif_to_png(dem_path, dem_path.replace('.tif', '.png'))
+
+    shutil.copyfile(geojson_path, snapshot_path)
+
+
 def convert_tif_to_png(input_tif_path, output_png_path):
     # Open the TIFF file
     with Image.open(input_tif_path) as img: